@@ -1,23 +1,48 @@
-from fastapi import FastAPI, UploadFile, File, Form, Response
+from fastapi import FastAPI, UploadFile, File, Form, Response, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.concurrency import run_in_threadpool
-from typing import Optional
+from typing import Optional, List
+import base64
 import sys
 import os
 import datetime
 import asyncio
+import time
+import shutil
+import json
 
 # Add root directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.image_processing import remove_background, auto_crop_face, smart_crop_welcome
+from utils.image_processing import (
+    remove_background, remove_background_batch, auto_crop_face, smart_crop_welcome,
+    decode_image, smart_crop_welcome_photo, process_id_photo, matte_id_photo,
+    auto_crop_face_photo, detect_id_crop_box,
+    warm_up, resolve_matting_model, get_image_hash
+)
 from utils.pdf_generator import generate_id_card_pdf, generate_id_card_preview
+from utils.render_tokens import RenderSession, store_render, get_render
+from utils.response_cache import (
+    render_key, etag_for, etag_matches, get_response, store_response, record_not_modified
+)
+from utils.layout import get_layout_plan
+from utils.bulk_jobs import create_job, start_job, get_job, iter_zip, iter_file
+from utils.job_queue import get_job_queue
+from utils.settings_manager import get_setting
+from utils.offload import run_render, run_ml, run_io, LOOP_LAG
+from utils.uploads import UploadLimitMiddleware, UploadRejected, read_image_upload
+from utils.metrics import MetricsMiddleware, render_metrics
 from utils.welcome_generator import generate_welcome_image
-from utils.business_card_generator import generate_business_card_pdf, generate_business_card_preview
-from utils.settings_manager import load_settings, save_settings
+from utils.business_card_generator import generate_business_card_pdf, generate_business_card_preview, generate_business_card_sheets
+from utils.settings_manager import load_settings, save_settings, settings_to_dict
+from utils.template_cache import invalidate_templates
+from utils.fonts import invalidate_fonts
 
 app = FastAPI()
 
+# Caps request bodies as they stream in (performance.max_upload_mb). Added
+# before CORS so CORS wraps it and early 413s still carry the CORS headers.
+app.add_middleware(UploadLimitMiddleware)
 # Allow CORS for local dev and Vercel
 app.add_middleware(
     CORSMiddleware,
@@ -25,19 +50,108 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Render-Token", "ETag"],
 )
+# Outermost, so rejected uploads and CORS preflights are measured too
+app.add_middleware(MetricsMiddleware)
+
+# Readiness is separate from liveness: the worker answers health checks while
+# models load, but only reports ready once warm-up has finished.
+_READINESS = {"ready": False, "warm": False, "error": None, "warmup_seconds": None}
+
+def _warm_up_models():
+    start = time.perf_counter()
+    try:
+        warm_up()
+        if get_setting("performance", "job_prewarm"):
+            get_job_queue().prewarm()
+        _READINESS["warm"] = True
+    except Exception as e:
+        # Still serve traffic; ML endpoints fall back to lazy loading
+        print(f"Model warm-up failed: {e}")
+        _READINESS["error"] = str(e)
+    _READINESS["warmup_seconds"] = round(time.perf_counter() - start, 2)
+    _READINESS["ready"] = True
+    print(f"Warm-up finished in {_READINESS['warmup_seconds']}s")
+
+@app.on_event("startup")
+async def start_warm_up():
+    LOOP_LAG.start()
+    if os.environ.get("WARMUP_ON_STARTUP", "1") == "0":
+        _READINESS["ready"] = True
+        return
+    # Run in the background so liveness checks answer immediately
+    asyncio.get_running_loop().create_task(run_ml(_warm_up_models))
+
+@app.on_event("shutdown")
+def stop_background_work():
+    LOOP_LAG.stop()
+    get_job_queue().shutdown()
 
 @app.get("/api/health")
 def health_check():
-    return {"status": "ok", "message": "Trikon API is running"}
+    return {"status": "ok", "message": "Trikon API is running", "ready": _READINESS["ready"],
+            "loop_lag_ms": LOOP_LAG.stats()["last_ms"]}
+
+@app.get("/api/metrics")
+def metrics():
+    """Prometheus text format: latency histograms, stage spans, caches, pools and queues."""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/ready")
+def readiness_check():
+    """Returns 503 until models are loaded, for load balancer health checks."""
+    return JSONResponse(content=dict(_READINESS), status_code=200 if _READINESS["ready"] else 503)
+
+def _bad_request(e):
+    """400 for invalid request parameters (unknown model, output, sheet size, ...)."""
+    return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+
+def _cached_render(request, key):
+    """
+    Answers a repeat render from its content key: 304 when the client already
+    holds it (If-None-Match), the cached bytes when another request rendered
+    it, else None so the endpoint renders.
+    """
+    etag = etag_for(key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        record_not_modified(key)
+        return Response(status_code=304, headers={"ETag": etag})
+    cached = get_response(key)
+    if cached is None:
+        return None
+    content, media_type, headers = cached
+    # A render token outlives its cached response only as long as its session
+    headers = {k: v for k, v in headers.items() if k != "X-Render-Token" or get_render(v)}
+    return Response(content=content, media_type=media_type, headers={**headers, "ETag": etag})
+
+def _render_key(kind, layout, variant, fields, contents=None):
+    """
+    render_key for a layout plus the upload's hash. Stats the settings,
+    template and font files, so the handlers call it on the io executor.
+    """
+    photo_hash = get_image_hash(contents) if contents is not None else None
+    return render_key(kind, get_layout_plan(layout, variant), fields, photo_hash)
+
+def _store_render_response(key, content, media_type, headers=None):
+    store_response(key, content, media_type, headers)
+    return Response(content=content, media_type=media_type, headers={**(headers or {}), "ETag": etag_for(key)})
 
 @app.post("/api/remove-bg")
-async def api_remove_bg(file: UploadFile = File(...)):
+async def api_remove_bg(
+    file: UploadFile = File(...),
+    model: Optional[str] = Form(None),
+    quality: str = Form("high") # "fast" uses the lighter preview model
+):
     try:
-        contents = await file.read()
-        print(f"BG Removal request: {file.filename}, {len(contents)} bytes")
+        model = resolve_matting_model(model, quality)
+    except ValueError as e:
+        return _bad_request(e)
+    contents = await read_image_upload(file)
+    try:
+        print(f"BG Removal request: {file.filename}, {len(contents)} bytes, model {model}")
         # Offload heavy ML task to threadpool
-        processed = await run_in_threadpool(remove_background, contents)
+        processed = await run_ml(remove_background, contents, model)
         if processed:
             print(f"BG Removal success: {len(processed)} bytes")
             return Response(content=processed, media_type="image/png")
@@ -48,18 +162,49 @@ async def api_remove_bg(file: UploadFile = File(...)):
         print(f"BG Removal Critical error: {e}")
         return Response(content=f'{{"error": "{str(e)}"}}', status_code=500, media_type="application/json")
 
+@app.post("/api/remove-bg/batch")
+async def api_remove_bg_batch(
+    files: List[UploadFile] = File(...),
+    model: Optional[str] = Form(None),
+    quality: str = Form("high")
+):
+    """Removes backgrounds for many photos at once; results keep request order."""
+    try:
+        model = resolve_matting_model(model, quality)
+    except ValueError as e:
+        return _bad_request(e)
+    # A rejected file fails on its own, like an undecodable one
+    contents, rejected = [], {} # rejected: Key: upload index, Value: reason (filenames repeat, e.g. image.jpg)
+    for index, f in enumerate(files):
+        try:
+            contents.append(await read_image_upload(f))
+        except UploadRejected as e:
+            contents.append(b"")
+            rejected[index] = e.detail
+    print(f"Batch BG Removal request: {len(contents)} files, {sum(len(c) for c in contents)} bytes")
+    processed = await run_ml(remove_background_batch, contents, model)
+    
+    results = []
+    for index, (f, png) in enumerate(zip(files, processed)):
+        if png:
+            results.append({"filename": f.filename, "status": "ok", "image": base64.b64encode(png).decode("ascii")})
+        else:
+            results.append({"filename": f.filename, "status": "error", "message": rejected.get(index, "Failed to process")})
+    return {"results": results}
+
 @app.post("/api/auto-crop")
 async def api_auto_crop(file: UploadFile = File(...), type: str = Form("id_card")):
-    contents = await file.read()
+    contents = await read_image_upload(file)
     if type == "welcome":
-        processed = await run_in_threadpool(smart_crop_welcome, contents)
+        processed = await run_ml(smart_crop_welcome, contents)
     else:
-        processed = await run_in_threadpool(auto_crop_face, contents)
+        processed = await run_ml(auto_crop_face, contents)
     
     return Response(content=processed, media_type="image/png")
 
 @app.post("/api/preview-id-card")
 async def api_preview_id_card(
+    request: Request,
     file: UploadFile = File(...),
     first_name: str = Form(...),
     last_name: str = Form(...),
@@ -73,59 +218,68 @@ async def api_preview_id_card(
     x_offset: int = Form(0),
     y_offset: int = Form(0),
     use_auto_crop: bool = Form(True),
-    use_ai_removal: bool = Form(True)
+    use_ai_removal: bool = Form(True),
+    model: Optional[str] = Form(None),
+    quality: str = Form("fast") # Previews favour latency over matte edges
 ):
-    contents = await file.read()
-    
-    # Parallelize pre-processing
-    tasks = []
-    if use_auto_crop:
-        tasks.append(run_in_threadpool(auto_crop_face, contents))
-    else:
-        # If no crop, just pass contents through
-        async def identity(c): return c
-        tasks.append(identity(contents))
-        
-    if use_ai_removal:
-        tasks.append(run_in_threadpool(remove_background, contents))
+    try:
+        model = resolve_matting_model(model, quality)
+    except ValueError as e:
+        return _bad_request(e)
+    contents = await read_image_upload(file)
 
-    # Wait for both (if both enabled)
-    results = await asyncio.gather(*tasks)
-    
-    # Logic: If both enabled, results[0] is crop, results[1] is bg removal of ORIGINAL.
-    # We actually want them chained: Crop -> BG Removal.
-    # Re-evaluating: To save time, we crop the result of BG removal? No, BG removal is slower.
-    # Let's keep them chained for quality, but parallel is only possible if they are independent.
-    # Current implementation: they both act on ORIGINAL "contents". 
-    # This might result in a BG removed full image that isn't cropped.
-    
-    # Correct Parallel Strategy: 
-    # 1. Resize is done internally in both.
-    # 2. Both are ML tasks.
-    # To be fast AND correct: 
-    # If both enabled, we can't truly parallelize them perfectly because they depend on each other for final result.
-    # HOWEVER, we can use the cache!
-    
-    final_contents = contents
+    fields = {
+        "first_name": first_name, "last_name": last_name, "title": title, "id_number": id_number,
+        "doj": doj, "emergency_no": emergency_no, "blood_group": blood_group, "office_address": office_address,
+        "scale": scale, "x_offset": x_offset, "y_offset": y_offset, "use_auto_crop": use_auto_crop,
+        "use_ai_removal": use_ai_removal, "model": model,
+    }
+    key = await run_io(_render_key, "id_card_preview", "id_card", None, fields, contents)
+    cached = _cached_render(request, key)
+    if cached is not None:
+        return cached
+
+    # Crop detection reads a small draft decode of the upload while the full
+    # image decodes; the matte then runs once, on the crop. Matte cache keys
+    # derive from the crop box, so rembg only re-runs when the crop changes.
     if use_auto_crop:
-        final_contents = await run_in_threadpool(auto_crop_face, final_contents)
-    if use_ai_removal:
-        final_contents = await run_in_threadpool(remove_background, final_contents)
+        photo, box = await asyncio.gather(run_ml(decode_image, contents), run_ml(detect_id_crop_box, contents))
+        cropped = await run_ml(auto_crop_face_photo, photo, box) if photo is not None else None
+    else:
+        cropped = await run_ml(decode_image, contents)
+    final_contents = await run_ml(matte_id_photo, cropped, use_ai_removal, model)
 
-    preview_bytes = generate_id_card_preview(
+    preview_bytes = await run_render(
+        generate_id_card_preview,
         first_name, last_name, title, id_number, doj,
         final_contents, emergency_no, blood_group, office_address,
         scale, x_offset, y_offset
     )
-    
+
     if preview_bytes:
-        return Response(content=preview_bytes, media_type="image/png")
+        # /api/generate-id-card redeems the token to skip the crop and matte
+        token = None
+        if cropped is not None:
+            source_key = await run_io(get_image_hash, contents)
+            session = RenderSession(
+                source_key, use_auto_crop, cropped,
+                model if use_ai_removal else None, final_contents
+            )
+            final_model = resolve_matting_model(None, "high")
+            if use_ai_removal and model != final_model:
+                # Fast preview: matte with the final model in the background so
+                # generate (quality "high") doesn't start it from scratch
+                session.final_model = final_model
+                session.final = asyncio.ensure_future(run_ml(matte_id_photo, cropped, True, final_model))
+            token = store_render(session)
+        headers = {"X-Render-Token": token} if token else None
+        return _store_render_response(key, preview_bytes, "image/png", headers)
     
     return Response(content='{"error": "Failed to generate preview"}', status_code=500, media_type="application/json")
 
 @app.post("/api/generate-id-card")
 async def api_generate_id_card(
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
     first_name: str = Form(...),
     last_name: str = Form(...),
     title: str = Form(...),
@@ -138,18 +292,45 @@ async def api_generate_id_card(
     x_offset: int = Form(0),
     y_offset: int = Form(0),
     use_auto_crop: bool = Form(True),
-    use_ai_removal: bool = Form(True)
+    use_ai_removal: bool = Form(True),
+    model: Optional[str] = Form(None),
+    quality: str = Form("high"),
+    render_token: Optional[str] = Form(None) # X-Render-Token from /api/preview-id-card
 ):
-    contents = await file.read()
-    
-    final_contents = contents
-    if use_auto_crop:
-        final_contents = await run_in_threadpool(auto_crop_face, final_contents)
-    if use_ai_removal:
-        final_contents = await run_in_threadpool(remove_background, final_contents)
+    try:
+        model = resolve_matting_model(model, quality)
+    except ValueError as e:
+        return _bad_request(e)
+    contents = await read_image_upload(file) if file is not None else None
+
+    # Redeem the preview's render when it still describes this request
+    session = get_render(render_token)
+    if session is not None and contents is not None and session.source_key != await run_io(get_image_hash, contents):
+        session = None
+    if session is not None and session.use_auto_crop != use_auto_crop:
+        session = None
+    if session is None and contents is None:
+        return JSONResponse(status_code=400, content={"status": "error", "message": "Upload a photo or pass a valid render_token"})
+
+    requested_model = model if use_ai_removal else None
+    if session is not None:
+        # Crop is reusable; so is the preview's matte, or the final-model matte
+        # it started, when the model matches. Otherwise matte again (the matte
+        # cache still skips rembg if this crop was matted with `model` before).
+        final_contents = None
+        if session.model == requested_model:
+            final_contents = session.photo
+        elif session.final_model == requested_model:
+            await asyncio.wait({session.final})
+            final_contents = session.final_photo()
+        if final_contents is None:
+            final_contents = await run_ml(matte_id_photo, session.cropped, use_ai_removal, model)
+    else:
+        final_contents = await run_ml(process_id_photo, contents, use_auto_crop, use_ai_removal, model)
 
     # Generate PDF
-    pdf_bytes = generate_id_card_pdf(
+    pdf_bytes = await run_render(
+        generate_id_card_pdf,
         first_name, last_name, title, id_number, doj,
         final_contents, emergency_no, blood_group, office_address,
         scale, x_offset, y_offset
@@ -162,6 +343,7 @@ async def api_generate_id_card(
 
 @app.post("/api/generate-welcome")
 async def api_generate_welcome(
+    request: Request,
     file: UploadFile = File(...),
     first_name: str = Form(...),
     last_name: str = Form(...),
@@ -169,22 +351,32 @@ async def api_generate_welcome(
     doj: str = Form(...), # ISO string
     use_auto_crop: bool = Form(True)
 ):
-    contents = await file.read()
+    contents = await read_image_upload(file)
+
+    fields = {"first_name": first_name, "last_name": last_name, "title": title, "doj": doj, "use_auto_crop": use_auto_crop}
+    key = await run_io(_render_key, "welcome", "welcome", None, fields, contents)
+    cached = _cached_render(request, key)
+    if cached is not None:
+        return cached
     
+    photo = await run_ml(decode_image, contents)
+    if photo is None:
+        return {"status": "error", "message": "Unsupported image"}
     if use_auto_crop:
-        contents = await run_in_threadpool(smart_crop_welcome, contents)
+        photo = await run_ml(smart_crop_welcome_photo, photo)
         
     date_obj = datetime.datetime.strptime(doj, "%Y-%m-%d")
     
-    img_bytes = generate_welcome_image(first_name, last_name, title, date_obj, contents)
+    img_bytes = await run_render(generate_welcome_image, first_name, last_name, title, date_obj, photo)
     
     if img_bytes:
-        return Response(content=img_bytes, media_type="image/jpeg")
+        return _store_render_response(key, img_bytes, "image/jpeg")
     
     return {"status": "error", "message": "Failed to generate Welcome Image"}
 
 @app.post("/api/preview-business-card")
 async def api_preview_business_card(
+    request: Request,
     template: str = Form(...),
     first_name: str = Form(...),
     last_name: str = Form(...),
@@ -198,12 +390,17 @@ async def api_preview_business_card(
     address_line2: str = Form(...)
 ):
     data = locals()
-    del data["template"]
+    del data["template"], data["request"]
+
+    key = await run_io(_render_key, "business_card_preview", "business_card", template, dict(data, template=template))
+    cached = _cached_render(request, key)
+    if cached is not None:
+        return cached
     
-    img_bytes = await run_in_threadpool(generate_business_card_preview, template, data)
+    img_bytes = await run_render(generate_business_card_preview, template, data)
     
     if img_bytes:
-         return Response(content=img_bytes, media_type="image/png")
+         return _store_render_response(key, img_bytes, "image/png")
     return {"status": "error", "message": "Failed to generate preview"}
 
 @app.post("/api/generate-business-card")
@@ -223,23 +420,140 @@ async def api_generate_business_card(
     data = locals()
     del data["template"]
     
-    pdf_bytes = await run_in_threadpool(generate_business_card_pdf, template, data)
+    pdf_bytes = await run_render(generate_business_card_pdf, template, data)
     
     if pdf_bytes:
          return Response(content=pdf_bytes, media_type="application/pdf", headers={"Content-Disposition": f"attachment; filename=BusinessCard_{first_name}.pdf"})
+
+def _spool(upload, path):
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f, 1024 * 1024)
+
+@app.post("/api/bulk/id-cards")
+async def api_bulk_id_cards(
+    csv_file: UploadFile = File(...), # first_name, last_name, title, id_number, doj, ...
+    photos: UploadFile = File(...), # ZIP of photos named <id_number>.jpg/png
+    output: str = Form("zip"), # "zip" (one PDF per card), "pdf" (one merged PDF) or "sheets" (imposed N-up)
+    use_auto_crop: bool = Form(True),
+    use_ai_removal: bool = Form(True),
+    model: Optional[str] = Form(None),
+    quality: str = Form("high"),
+    sheet: str = Form("A4"), # output="sheets" only, from here down
+    bleed_mm: float = Form(3.0),
+    crop_marks: bool = Form(True),
+    duplex: bool = Form(True),
+    flip: str = Form("long"),
+    cols: Optional[int] = Form(None),
+    rows: Optional[int] = Form(None)
+):
+    imposition = {"sheet": sheet, "bleed_mm": bleed_mm, "crop_marks": crop_marks,
+                  "duplex": duplex, "flip": flip, "cols": cols, "rows": rows}
+    try:
+        model = resolve_matting_model(model, quality)
+        job = create_job(output, use_auto_crop, use_ai_removal, model, imposition)
+    except ValueError as e:
+        return _bad_request(e)
+    # Uploads go straight to the job's temp dir, never fully into memory
+    await run_io(_spool, csv_file, job.csv_path)
+    await run_io(_spool, photos, job.zip_path)
+    start_job(job)
+    return {
+        "job_id": job.id,
+        "status_url": f"/api/bulk/id-cards/{job.id}",
+        "download_url": f"/api/bulk/id-cards/{job.id}/download",
+    }
+
+@app.post("/api/impose/business-cards")
+async def api_impose_business_cards(body: dict):
+    """
+    Print sheets for many business cards. Body: {"template": "Trikon", "cards": [{first_name, ...}],
+    "sheet": "A4"|"A3"|"SRA3", "bleed_mm", "gap_mm", "margin_mm", "cols", "rows", "crop_marks", "duplex", "flip"}
+    """
+    cards = body.get("cards") or []
+    if not cards:
+        return JSONResponse(status_code=400, content={"error": "No cards"})
+    options = {k: body[k] for k in ("sheet", "landscape", "cols", "rows", "bleed_mm", "gap_mm", "margin_mm",
+                                    "crop_marks", "duplex", "flip") if k in body}
+    try:
+        pdf_bytes = await run_render(generate_business_card_sheets, body.get("template", "Metaweb"), cards, **options)
+    except (ValueError, KeyError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return Response(content=pdf_bytes, media_type="application/pdf",
+                    headers={"Content-Disposition": "attachment; filename=BusinessCards_print.pdf"})
+
+@app.get("/api/bulk/id-cards/{job_id}")
+def api_bulk_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown job"})
+    return job.to_dict()
+
+@app.get("/api/bulk/id-cards/{job_id}/download")
+async def api_bulk_download(job_id: str):
+    """ZIP mode streams cards as they complete; the merged PDF is sent once written."""
+    job = get_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown job"})
+    if job.output == "zip":
+        return StreamingResponse(iter_zip(job), media_type="application/zip",
+                                 headers={"Content-Disposition": f"attachment; filename=id_cards_{job.id[:8]}.zip"})
+    while not job.done:
+        await asyncio.sleep(0.5)
+    if not job.merged_path:
+        return JSONResponse(status_code=422, content=job.to_dict())
+    return StreamingResponse(iter_file(job.merged_path), media_type="application/pdf",
+                             headers={"Content-Disposition": f"attachment; filename=id_cards_{job.id[:8]}.pdf"})
+
+@app.post("/api/jobs", status_code=202)
+async def api_submit_job(
+    kind: str = Form(...), # id_card_pdf, id_card_preview, welcome_image, business_card_pdf, remove_bg
+    params: str = Form("{}"), # JSON object with the same fields as the matching endpoint
+    file: Optional[UploadFile] = File(None),
+    timeout: Optional[float] = Form(None) # seconds, defaults to performance.job_timeout_seconds
+):
+    """Queues heavy generation on the worker process pool; poll status, then fetch the result."""
+    try:
+        params = json.loads(params)
+        contents = await read_image_upload(file) if file is not None else None
+        job = await run_io(get_job_queue().submit, kind, params, contents, timeout)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return dict(job.to_dict(), status_url=f"/api/jobs/{job.id}", result_url=f"/api/jobs/{job.id}/result")
+
+@app.get("/api/jobs/{job_id}")
+def api_job_status(job_id: str):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown job"})
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/result")
+def api_job_result(job_id: str):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown job"})
+    if job.status != "done":
+        return JSONResponse(status_code=409 if job.status in ("queued", "running") else 422, content=job.to_dict())
+    return Response(content=job.result, media_type=job.media_type)
+
+@app.delete("/api/jobs/{job_id}")
+def api_cancel_job(job_id: str):
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown job"})
+    return job.to_dict()
+
 @app.get("/api/admin/settings")
 async def get_admin_settings():
-    return load_settings()
+    return settings_to_dict(await run_io(load_settings))
 
 @app.post("/api/admin/settings")
 async def update_admin_settings(settings: dict):
-    if save_settings(settings):
+    if await run_io(save_settings, settings):
         return {"status": "success"}
     return Response(content='{"error": "Failed to save settings"}', status_code=500, media_type="application/json")
 
-@app.get("/api/admin/assets")
-async def list_assets():
-    """Lists available templates and fonts for the admin UI."""
+def _scan_assets():
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     templates_dir = os.path.join(base_dir, "Templates")
     fonts_dir = os.path.join(base_dir, "fonts")
@@ -261,6 +575,11 @@ async def list_assets():
         "fonts": fonts
     }
 
+@app.get("/api/admin/assets")
+async def list_assets():
+    """Lists available templates and fonts for the admin UI."""
+    return await run_io(_scan_assets)
+
 @app.post("/api/admin/upload-asset")
 async def upload_asset(file: UploadFile = File(...), category: str = Form(...)):
     """Handles uploading of templates or fonts."""
@@ -278,12 +597,15 @@ async def upload_asset(file: UploadFile = File(...), category: str = Form(...)):
     if not file.filename.lower().endswith(allowed):
         return Response(content=f'{{"error": "Invalid file type. Allowed: {allowed}"}}', status_code=400, media_type="application/json")
 
-    os.makedirs(target_dir, exist_ok=True)
     file_path = os.path.join(target_dir, file.filename)
     
     try:
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
+        await run_io(os.makedirs, target_dir, exist_ok=True)
+        await run_io(_spool, file, file_path)
+        if category == "template":
+            invalidate_templates()
+        else:
+            invalidate_fonts()
         return {"status": "success", "filename": file.filename, "path": file_path}
     except Exception as e:
         return Response(content=f'{{"error": "{str(e)}"}}', status_code=500, media_type="application/json")
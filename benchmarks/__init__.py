@@ -0,0 +1,17 @@
+"""
+Benchmarks for the image and rendering pipelines.
+
+    python -m benchmarks run --out before.json
+    python -m benchmarks run --out after.json --compare before.json
+    python -m benchmarks compare before.json after.json
+
+Fixtures are synthetic portraits generated from a fixed seed (fixtures.py).
+--stub-model swaps the rembg sessions for a calibrated CPU-cost stub
+(stubs.py), for machines without the model files. Runs use
+benchmarks/settings.json (the idcard.pdf template) unless --settings is
+given, and exit non-zero when any case fails.
+
+HTTP load test of the whole backend (loadtest.py):
+
+    python -m benchmarks.loadtest --concurrency 8 --duration 30 --out load.json
+"""
@@ -0,0 +1,90 @@
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import SETTINGS
+
+
+def _run(args):
+    # Must happen before utils modules read their settings at import
+    import utils.settings_manager as settings_manager
+    settings_manager.SETTINGS_FILE = os.path.abspath(args.settings)
+    if args.stub_model is not None:
+        from benchmarks.stubs import install_stub_sessions
+        install_stub_sessions(args.stub_model if args.stub_model >= 0 else None)
+    from benchmarks import suite
+    from benchmarks.fixtures import SIZES
+
+    sizes = args.sizes.split(",")
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        sys.exit(f"Unknown size(s): {', '.join(unknown)}. Available: {', '.join(SIZES)}")
+    formats = args.formats.upper().split(",") if args.formats else None
+    only = args.only.split(",") if args.only else None
+
+    print("Preparing fixtures ...", file=sys.stderr)
+    cases = suite.build_cases(sizes, formats, only)
+    print(f"Running {len(cases)} cases ({args.cold} cold, {args.warm} warm each)", file=sys.stderr)
+    options = {"sizes": sizes, "formats": formats, "cold": args.cold, "warm": args.warm,
+               "stub_model": args.stub_model, "only": only}
+    report = suite.run_suite(cases, args.cold, args.warm, lambda m: print(m, file=sys.stderr), options)
+    print(suite.format_report(report))
+    if args.out:
+        suite.save_report(report, args.out)
+        print(f"Saved {args.out}")
+    failed = [f"{r['name']}[{r['fixture']}]" for r in report["results"] if "error" in r]
+    status = _print_comparison(suite.load_report(args.compare), report, args.threshold) if args.compare else 0
+    if failed:
+        # A failing case has no timings; don't let the run pass as a benchmark
+        print(f"{len(failed)} case(s) failed: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return status
+
+
+def _compare(args):
+    from benchmarks import suite
+    return _print_comparison(suite.load_report(args.base), suite.load_report(args.new), args.threshold)
+
+
+def _print_comparison(base, new, threshold):
+    from benchmarks import suite
+    lines, regressions = suite.compare(base, new, threshold)
+    print("\n".join(lines))
+    print(f"{regressions} regression(s) over {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Image and rendering pipeline benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite")
+    run.add_argument("--sizes", default="small,phone", help="fixture sizes: small, phone, large")
+    run.add_argument("--formats", help="fixture formats, default JPEG,PNG,WEBP (as supported)")
+    run.add_argument("--only", help="comma-separated substrings of case names to run")
+    run.add_argument("--cold", type=int, default=3, help="cold calls per case (caches cleared)")
+    run.add_argument("--warm", type=int, default=10, help="warm calls per case")
+    run.add_argument("--stub-model", type=float, nargs="?", const=-1, default=None, metavar="MS",
+                     help="replace rembg sessions with a CPU-cost stub (optional fixed cost in ms)")
+    run.add_argument("--settings", default=SETTINGS,
+                     help="settings.json to run with (default benchmarks/settings.json)")
+    run.add_argument("--out", help="write results as JSON")
+    run.add_argument("--compare", metavar="BASE", help="compare against a saved JSON run")
+    run.add_argument("--threshold", type=float, default=0.10, help="regression threshold (0.10 = 10%%)")
+    run.set_defaults(handler=_run)
+
+    cmp = commands.add_parser("compare", help="compare two saved runs")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.10)
+    cmp.set_defaults(handler=_compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
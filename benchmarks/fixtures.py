@@ -0,0 +1,76 @@
+import io
+import os
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+# Synthetic portraits: deterministic (seeded), so every run measures the same
+# bytes. Sizes cover a webcam shot, a typical phone photo and a 48 MP sensor.
+SIZES = {
+    "small": (720, 960),
+    "phone": (3024, 4032),
+    "large": (6000, 8000),
+}
+FORMATS = ("JPEG", "PNG", "WEBP")
+
+# Settings the suite and load test run with unless --settings says otherwise.
+# The default ID card template (Name_Trikon.pdf) is business-card sized and
+# drops the ID card's back text; this fixture selects idcard.pdf.
+SETTINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json")
+
+_SEED = 1234
+
+
+def portrait(width, height, seed=_SEED):
+    """A head-and-shoulders figure on a gradient backdrop, with sensor-like noise."""
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    backdrop = np.stack([90 + 80 * y + 0 * x, 110 + 60 * x + 0 * y, 150 + 40 * (1 - y) + 0 * x], axis=-1)
+    image = Image.fromarray(backdrop.clip(0, 255).astype("uint8"))
+
+    draw = ImageDraw.Draw(image)
+    cx, unit = width / 2, min(width, height) / 10
+    draw.ellipse((cx - 3.6 * unit, height * 0.62, cx + 3.6 * unit, height * 1.25), fill=(40, 50, 80))  # shoulders
+    draw.rectangle((cx - 0.8 * unit, height * 0.45, cx + 0.8 * unit, height * 0.66), fill=(205, 160, 130))  # neck
+    face = (cx - 1.6 * unit, height * 0.22, cx + 1.6 * unit, height * 0.22 + 4.2 * unit)
+    draw.ellipse(face, fill=(225, 180, 150))
+    draw.pieslice((face[0] - 0.1 * unit, face[1] - 0.4 * unit, face[2] + 0.1 * unit, face[1] + 2.6 * unit),
+                  180, 360, fill=(50, 35, 25))  # hair
+    eye_y = face[1] + 1.8 * unit
+    for ex in (cx - 0.65 * unit, cx + 0.65 * unit):
+        draw.ellipse((ex - 0.25 * unit, eye_y - 0.12 * unit, ex + 0.25 * unit, eye_y + 0.12 * unit), fill=(40, 30, 30))
+    draw.arc((cx - 0.7 * unit, face[1] + 2.4 * unit, cx + 0.7 * unit, face[1] + 3.4 * unit), 20, 160,
+             fill=(150, 70, 70), width=max(1, int(unit / 12)))
+    image = image.filter(ImageFilter.GaussianBlur(max(1, unit / 40)))
+
+    noise = rng.normal(0, 6, (height, width, 3)).astype(np.float32)
+    pixels = np.asarray(image, dtype=np.float32) + noise
+    return Image.fromarray(pixels.clip(0, 255).astype("uint8"))
+
+
+def encode(image, fmt):
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        image.save(buf, format="JPEG", quality=90)
+    elif fmt == "WEBP":
+        image.save(buf, format="WEBP", quality=90)
+    else:
+        image.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+_CACHE = {} # Key: (size name, format), Value: bytes
+
+
+def fixture(size, fmt="JPEG"):
+    """Encoded portrait for a SIZES name and format, generated once per process."""
+    key = (size, fmt)
+    if key not in _CACHE:
+        _CACHE[key] = encode(portrait(*SIZES[size]), fmt)
+    return _CACHE[key]
+
+
+def available_formats():
+    """FORMATS this Pillow build can write (WebP is an optional codec)."""
+    from PIL import features
+    return tuple(f for f in FORMATS if f != "WEBP" or features.check("webp"))
@@ -0,0 +1,360 @@
+"""
+HTTP load test for backend/app.py with a stubbed matting model.
+
+    python -m benchmarks.loadtest --concurrency 8 --duration 30
+    python -m benchmarks.loadtest --ml-workers 2 --rembg-pool 2 --out ml2.json
+    python -m benchmarks.loadtest --url http://localhost:8000 --requests 500
+
+Without --url the app is served in-process by uvicorn on a free localhost
+port, with rembg sessions replaced by the CPU-cost stub (benchmarks/stubs.py),
+so no model downloads are needed. Worker and executor sizes are set through
+the same environment variables the app reads at import, which makes their
+effect measurable before a deploy.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import datetime
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import portrait, encode, SIZES, SETTINGS
+from benchmarks.suite import percentile
+
+# Key: traffic kind, Value: (method, path, expected response content type)
+ENDPOINTS = {
+    "preview": ("POST", "/api/preview-id-card", "image/png"),
+    "generate": ("POST", "/api/generate-id-card", "application/pdf"),
+    "remove_bg": ("POST", "/api/remove-bg", "image/png"),
+    "welcome": ("POST", "/api/generate-welcome", "image/jpeg"),
+    "bc_preview": ("POST", "/api/preview-business-card", "image/png"),
+    "bc_pdf": ("POST", "/api/generate-business-card", "application/pdf"),
+}
+DEFAULT_MIX = "preview=5,generate=2,remove_bg=2,welcome=1,bc_preview=2,bc_pdf=1"
+# A run stops once more than max_error_rate of its requests failed, checked
+# from this many requests on: latencies of a failing mix time the error path
+_ERROR_CHECK_AFTER = 20
+
+# Environment variables read at import by utils.offload / image_processing / job_queue
+_SIZING = {
+    "render_workers": "RENDER_WORKERS",
+    "ml_workers": "ML_WORKERS",
+    "io_workers": "IO_WORKERS",
+    "rembg_pool": "REMBG_POOL_SIZE",
+    "rembg_threads": "REMBG_INTRA_OP_THREADS",
+    "job_workers": "JOB_WORKERS",
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in ENDPOINTS:
+            raise ValueError(f"Unknown traffic kind: {kind}. Available: {', '.join(ENDPOINTS)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+class Traffic:
+    """
+    Deterministic request stream: kinds drawn by weight from a seeded RNG,
+    photos cycled from a fixed set, form fields unique per request unless
+    `distinct` caps them (so response caches can be exercised on purpose).
+    """
+
+    def __init__(self, mix, photos, distinct=0, seed=42):
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.photos = photos
+        self.distinct = distinct
+        self._rng = random.Random(seed)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            n = self._count
+            self._count += 1
+            kind = self._rng.choices(self.kinds, self.weights)[0]
+        variant = n % self.distinct if self.distinct else n
+        return kind, self._request(kind, variant)
+
+    def _request(self, kind, n):
+        photo = self.photos[n % len(self.photos)]
+        files = {"file": (f"photo{n % len(self.photos)}.jpg", photo, "image/jpeg")}
+        person = {"first_name": f"Load{n}", "last_name": "Test", "title": "Engineer"}
+        if kind in ("preview", "generate"):
+            data = dict(person, id_number=f"LT{n:06d}", doj="2024-03-18", emergency_no="+91 98765 43210",
+                        blood_group="O+", office_address="Centre Point 3\nChennai 600089")
+            if kind == "preview":
+                data["quality"] = "fast"
+            return {"data": data, "files": files}
+        if kind == "remove_bg":
+            return {"data": {"quality": "fast"}, "files": files}
+        if kind == "welcome":
+            return {"data": dict(person, doj="2024-03-18"), "files": files}
+        data = dict(person, template="Metaweb", phone_mobile="+91 98765 43210", phone_office="+91 44 4000 0000",
+                    email=f"load{n}@example.com", website="www.example.com", address="Chennai",
+                    address_line1="Centre Point 3", address_line2="Chennai 600089")
+        return {"data": data}
+
+
+async def _worker(client, traffic, deadline, remaining, results, state):
+    while time.perf_counter() < deadline and state["aborted"] is None:
+        if remaining is not None:
+            if remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+        kind, request = traffic.next()
+        method, path, expected = ENDPOINTS[kind]
+        started = time.perf_counter()
+        error = None
+        status = None
+        size = 0
+        try:
+            response = await client.request(method, path, **request)
+            status, size = response.status_code, len(response.content)
+            content_type = response.headers.get("content-type", "")
+            if status >= 400:
+                error = f"HTTP {status}"
+            elif not content_type.startswith(expected):
+                # Several endpoints report failures as 200 + JSON
+                error = f"unexpected {content_type or 'no content type'}"
+        except Exception as e:
+            error = type(e).__name__
+        results.append((kind, time.perf_counter() - started, status, size, error, started))
+        if error:
+            state["errors"] += 1
+        if len(results) >= _ERROR_CHECK_AFTER and state["errors"] > state["max_error_rate"] * len(results):
+            state["aborted"] = state["aborted"] or (
+                f"error rate {state['errors'] / len(results):.1%} over {state['max_error_rate']:.1%} "
+                f"after {len(results)} requests")
+
+
+async def _sample_lag(client, stop, samples, interval=0.5):
+    """Polls /api/health for the server's event-loop lag while the test runs."""
+    while not stop.is_set():
+        try:
+            response = await client.get("/api/health")
+            samples.append(response.json().get("loop_lag_ms", 0.0))
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _scrape_metrics(text):
+    """Picks the loop-lag and executor lines out of /api/metrics."""
+    wanted = ("trikon_event_loop_lag_max_seconds", "trikon_event_loop_slow_samples_total",
+              "trikon_executor_wait_seconds_avg", "trikon_executor_calls_total", "trikon_rembg_wait_seconds_max")
+    values = {}
+    for line in text.splitlines():
+        if line.startswith(wanted):
+            name, _, value = line.rpartition(" ")
+            values[name] = float(value)
+    return values
+
+
+async def run_load(base_url, traffic, concurrency, duration=None, requests=None, timeout=120.0, max_error_rate=0.05):
+    import httpx
+    results = []
+    lag_samples = []
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        for _ in range(600):  # Up to a minute for warm-up
+            try:
+                if (await client.get("/api/ready")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(_sample_lag(client, stop, lag_samples))
+        started = time.perf_counter()
+        deadline = started + duration if duration else float("inf")
+        remaining = [requests] if requests else None
+        state = {"errors": 0, "max_error_rate": max_error_rate, "aborted": None}
+        await asyncio.gather(*[_worker(client, traffic, deadline, remaining, results, state) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+        try:
+            server = _scrape_metrics((await client.get("/api/metrics")).text)
+        except Exception:
+            server = {}
+    return results, elapsed, lag_samples, server, state["aborted"]
+
+
+def _stats(latencies):
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+def summarize(results, elapsed, lag_samples, server):
+    by_kind = {}
+    for kind, latency, status, size, error, _ in results:
+        entry = by_kind.setdefault(kind, {"latencies": [], "errors": {}, "bytes": 0})
+        entry["latencies"].append(latency)
+        entry["bytes"] += size
+        if error:
+            entry["errors"][error] = entry["errors"].get(error, 0) + 1
+
+    def block(latencies, errors, count):
+        failed = sum(errors.values())
+        out = {"requests": count, "errors": failed, "error_rate": round(failed / count, 4) if count else 0.0,
+               "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0}
+        if latencies:
+            out.update(_stats(latencies))
+        if errors:
+            out["error_kinds"] = errors
+        return out
+
+    endpoints = {kind: block(e["latencies"], e["errors"], len(e["latencies"])) for kind, e in sorted(by_kind.items())}
+    all_errors = {}
+    for e in by_kind.values():
+        for name, n in e["errors"].items():
+            all_errors[name] = all_errors.get(name, 0) + n
+    overall = block([r[1] for r in results], all_errors, len(results))
+    lag = {}
+    if lag_samples:
+        lag = {"p50_ms": round(percentile(lag_samples, 50), 2), "p95_ms": round(percentile(lag_samples, 95), 2),
+               "max_sampled_ms": round(max(lag_samples), 2), "samples": len(lag_samples)}
+    if "trikon_event_loop_lag_max_seconds" in server:
+        lag["max_ms"] = round(server["trikon_event_loop_lag_max_seconds"] * 1000, 2)
+    if "trikon_event_loop_slow_samples_total" in server:
+        lag["slow_samples"] = int(server["trikon_event_loop_slow_samples_total"])
+    return {"duration_s": round(elapsed, 2), "overall": overall, "endpoints": endpoints,
+            "event_loop_lag": lag, "server": server}
+
+
+def format_summary(summary):
+    lines = [f"{'endpoint':<12} {'reqs':>6} {'rps':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"]
+    rows = list(summary["endpoints"].items()) + [("ALL", summary["overall"])]
+    for name, s in rows:
+        if "p50_ms" not in s:
+            continue
+        lines.append(f"{name:<12} {s['requests']:>6} {s['throughput_rps']:>7.2f} {s['error_rate'] * 100:>5.1f}% "
+                     f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}")
+    lines.append("(latencies in ms)")
+    for name, s in rows:
+        if s.get("error_kinds"):
+            lines.append(f"errors {name}: {s['error_kinds']}")
+    lag = summary["event_loop_lag"]
+    if lag:
+        lines.append("event loop lag: " + ", ".join(f"{k}={v}" for k, v in lag.items()))
+    if summary.get("aborted"):
+        lines.append(f"ABORTED: {summary['aborted']}; latencies above include failed requests")
+    return "\n".join(lines)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    """Serves backend.app in a background thread; returns the uvicorn Server."""
+    import uvicorn
+    from backend.app import app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, name="loadtest-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="target a running server instead of starting one in-process")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds (ignored with --requests)")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"kind=weight list (default {DEFAULT_MIX})")
+    parser.add_argument("--photos", type=int, default=8, help="distinct synthetic photos to cycle through")
+    parser.add_argument("--photo-size", default="small", choices=list(SIZES))
+    parser.add_argument("--distinct", type=int, default=0,
+                        help="distinct forms to cycle (0 = every request unique, defeating response caches)")
+    parser.add_argument("--stub-cost", type=float, help="stub matting cost in ms for every model (default per model)")
+    parser.add_argument("--settings", default=SETTINGS,
+                        help="settings.json for the in-process server (default benchmarks/settings.json)")
+    parser.add_argument("--max-error-rate", type=float, default=0.05,
+                        help="stop and exit 1 once this share of requests failed (default 0.05)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--out", help="write the summary as JSON")
+    for option, env_name in _SIZING.items():
+        parser.add_argument("--" + option.replace("_", "-"), type=int, help=f"sets {env_name} for the in-process server")
+    args = parser.parse_args(argv)
+
+    sizing = {}
+    server = None
+    base_url = args.url
+    if base_url is None:
+        for option, env_name in _SIZING.items():
+            value = getattr(args, option)
+            if value is not None:
+                os.environ[env_name] = str(value)
+                sizing[env_name] = value
+        import utils.settings_manager as settings_manager
+        settings_manager.SETTINGS_FILE = os.path.abspath(args.settings)
+        from benchmarks.stubs import install_stub_sessions
+        install_stub_sessions(args.stub_cost)
+        port = _free_port()
+        server, thread = start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    print(f"Preparing {args.photos} {args.photo_size} photos ...", file=sys.stderr)
+    width, height = SIZES[args.photo_size]
+    photos = [encode(portrait(width, height, seed=1000 + i), "JPEG") for i in range(args.photos)]
+    traffic = Traffic(parse_mix(args.mix), photos, args.distinct, args.seed)
+
+    target = f"{args.requests} requests" if args.requests else f"{args.duration:.0f}s"
+    print(f"Load: {target} at concurrency {args.concurrency} against {base_url}", file=sys.stderr)
+    results, elapsed, lag_samples, server_metrics, aborted = asyncio.run(run_load(
+        base_url, traffic, args.concurrency, None if args.requests else args.duration, args.requests,
+        args.timeout, args.max_error_rate))
+
+    summary = summarize(results, elapsed, lag_samples, server_metrics)
+    if aborted is None and summary["overall"]["error_rate"] > args.max_error_rate:
+        aborted = f"error rate {summary['overall']['error_rate']:.1%} over {args.max_error_rate:.1%}"
+    summary["aborted"] = aborted
+    summary["config"] = {
+        "url": args.url, "concurrency": args.concurrency, "mix": parse_mix(args.mix), "photos": args.photos,
+        "photo_size": args.photo_size, "distinct": args.distinct, "stub_cost_ms": args.stub_cost,
+        "settings": None if args.url else args.settings, "max_error_rate": args.max_error_rate,
+        "sizing": sizing, "cpu_count": os.cpu_count(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    }
+    print(format_summary(summary))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Saved {args.out}")
+
+    if server is not None:
+        server.should_exit = True
+        thread.join(timeout=10)
+    return 1 if aborted or summary["overall"]["requests"] == 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import time
+import numpy as np
+from types import SimpleNamespace
+from PIL import Image, ImageDraw
+
+# Stand-in for rembg/ONNX sessions so benchmarks and load tests run without
+# model downloads. Each inference burns a fixed amount of CPU in NumPy (which,
+# like onnxruntime, releases the GIL), calibrated once to roughly match the
+# real model's per-image cost, and returns a centered elliptical mask.
+MODEL_COST_MS = {
+    "u2net": 250,
+    "u2netp": 60,
+    "isnet-general-use": 400,
+    "silueta": 60,
+}
+
+_BLOCK = 192
+_UNIT_SECONDS = None
+
+
+def _burn(units):
+    a = np.full((_BLOCK, _BLOCK), 1.0001, dtype=np.float32)
+    for _ in range(units):
+        a = a @ a
+        a /= a.max()
+
+
+def _units_for(cost_ms):
+    """Matmul count matching cost_ms on this machine (calibrated on first use)."""
+    global _UNIT_SECONDS
+    if _UNIT_SECONDS is None:
+        _burn(3)
+        start = time.perf_counter()
+        _burn(50)
+        _UNIT_SECONDS = (time.perf_counter() - start) / 50
+    return max(1, round(cost_ms / 1000 / _UNIT_SECONDS))
+
+
+def _mask(size):
+    width, height = size
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).ellipse((width * 0.15, height * 0.1, width * 0.85, height * 1.1), fill=255)
+    return mask
+
+
+class _StubInner:
+    """The parts of onnxruntime.InferenceSession the batched matting path uses."""
+
+    def __init__(self, model, units):
+        from utils.image_processing import MATTING_MODELS
+        self._size = MATTING_MODELS.get(model, MATTING_MODELS["u2net"])[0]
+        self._units = units
+        self._input = SimpleNamespace(name="input.1", shape=["batch", 3, self._size[1], self._size[0]])
+
+    def get_inputs(self):
+        return [self._input]
+
+    def run(self, outputs, feed):
+        batch = feed[self._input.name]
+        _burn(self._units * len(batch))
+        mask = np.asarray(_mask(self._size), dtype=np.float32)[None, None] / 255
+        return [np.repeat(mask, len(batch), axis=0)]
+
+
+class CpuCostSession:
+    """Deterministic CPU-cost replacement for a rembg session."""
+
+    def __init__(self, model="u2net", cost_ms=None):
+        self.model = model
+        self.cost_ms = MODEL_COST_MS.get(model, 250) if cost_ms is None else cost_ms
+        self._units = _units_for(self.cost_ms) if self.cost_ms > 0 else 0
+        self.inner_session = _StubInner(model, self._units)
+
+    def predict(self, img, *args, **kwargs):
+        _burn(self._units)
+        return [_mask(img.size)]
+
+
+def install_stub_sessions(cost_ms=None):
+    """
+    Makes every rembg pool created from now on hand out CpuCostSessions.
+    cost_ms overrides the per-model cost for all models.
+    """
+    from utils import image_processing
+    image_processing.create_rembg_session = lambda model="u2net": CpuCostSession(model, cost_ms)
+    # Pools already holding real sessions would bypass the stub
+    with image_processing._REMBG_POOL_LOCK:
+        image_processing._REMBG_POOLS.clear()
@@ -0,0 +1,249 @@
+import os
+import io
+import sys
+import json
+import time
+import platform
+import datetime
+import resource
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout
+from benchmarks.fixtures import fixture, available_formats
+
+# Cold: every cache in the pipeline is cleared before the call (decoded images,
+# crop boxes, mattes, rasterized backgrounds, templates, fonts, layout plans).
+# Loaded model sessions are kept, so the very first call of a case, which
+# also pays for session creation, is reported separately as first_s.
+# Warm: the same call repeated with caches populated, as in a re-render.
+
+ID_FIELDS = ("Ada", "Lovelace", "Analytical Engineer", "TR-0042", "2024-03-18")
+ID_EXTRA = ("+91 98765 43210", "O+", "Centre Point 3, 7th Floor\nMount Poonamallee High Road\nChennai 600089")
+BUSINESS_CARD = {
+    "first_name": "Ada", "last_name": "Lovelace", "title": "Analytical Engineer",
+    "phone_mobile": "+91 98765 43210", "phone_office": "+91 44 4000 0000", "email": "ada@example.com",
+    "website": "www.example.com", "address": "Centre Point 3, Chennai",
+    "address_line1": "Centre Point 3, 7th Floor", "address_line2": "Porur, Chennai 600089",
+}
+
+
+class Case:
+    def __init__(self, name, fixture_label, call):
+        self.name = name
+        self.fixture = fixture_label
+        self.call = call
+
+    @property
+    def key(self):
+        return f"{self.name}[{self.fixture}]"
+
+
+def reset_caches():
+    from utils import image_processing, preview_renderer, layout
+    from utils.template_cache import invalidate_templates
+    from utils.fonts import invalidate_fonts
+    image_processing._IMAGE_CACHE.clear()
+    preview_renderer._BACKGROUNDS.clear()
+    with layout._LOCK:
+        layout._PLANS.clear()
+    invalidate_templates()
+    invalidate_fonts()
+
+
+def build_cases(sizes, formats=None, only=None):
+    from utils import image_processing as ip
+    from utils.pdf_generator import generate_id_card_pdf, generate_id_card_preview
+    from utils.welcome_generator import generate_welcome_image
+    from utils.business_card_generator import generate_business_card_pdf, generate_business_card_preview
+
+    formats = formats or available_formats()
+    cases = []
+    for size in sizes:
+        for fmt in formats:
+            data = fixture(size, fmt)
+            label = f"{size}/{fmt}"
+            cases += [
+                Case("normalize_image", label, lambda d=data: ip.normalize_image(d)),
+                Case("resize_image_bytes", label, lambda d=data: ip.resize_image_bytes(d)),
+                Case("auto_crop_face", label, lambda d=data: ip.auto_crop_face(d)),
+                Case("remove_background", label, lambda d=data: ip.remove_background(d)),
+            ]
+
+    # Generators get the same decoded phone photo; decoding is measured above
+    photo_label = f"{sizes[-1]}/JPEG"
+    photo = ip.decode_image(fixture(sizes[-1], "JPEG"))
+    doj = datetime.datetime(2024, 3, 18)
+    cases += [
+        Case("generate_id_card_pdf", photo_label, lambda: generate_id_card_pdf(*ID_FIELDS, photo, *ID_EXTRA)),
+        Case("generate_id_card_preview", photo_label, lambda: generate_id_card_preview(*ID_FIELDS, photo, *ID_EXTRA)),
+        Case("generate_welcome_image", photo_label, lambda: generate_welcome_image("Ada", "Lovelace", "Analytical Engineer", doj, photo)),
+        Case("generate_business_card_pdf", "Metaweb", lambda: generate_business_card_pdf("Metaweb", dict(BUSINESS_CARD))),
+        Case("generate_business_card_preview", "Metaweb", lambda: generate_business_card_preview("Metaweb", dict(BUSINESS_CARD))),
+    ]
+    if only:
+        cases = [c for c in cases if any(part in c.key for part in only)]
+    return cases
+
+
+def percentile(samples, q):
+    """Linear-interpolated percentile, q in [0, 100]."""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    pos = (len(ordered) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def summarize(samples):
+    if not samples:
+        return None
+    return {
+        "n": len(samples),
+        "p50_s": round(percentile(samples, 50), 6),
+        "p95_s": round(percentile(samples, 95), 6),
+        "mean_s": round(sum(samples) / len(samples), 6),
+        "min_s": round(min(samples), 6),
+        "max_s": round(max(samples), 6),
+    }
+
+
+def _max_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _timed(call):
+    with redirect_stdout(io.StringIO()):  # The pipeline logs cache hits on every call
+        start = time.perf_counter()
+        result = call()
+        elapsed = time.perf_counter() - start
+    if result is None:
+        raise RuntimeError("returned None")
+    return elapsed
+
+
+def run_case(case, cold=3, warm=10):
+    rss_before = _max_rss_mb()
+    result = {"name": case.name, "fixture": case.fixture}
+    try:
+        reset_caches()
+        first = _timed(case.call)
+        cold_samples = [first]
+        for _ in range(cold - 1):
+            reset_caches()
+            cold_samples.append(_timed(case.call))
+        warm_samples = [_timed(case.call) for _ in range(warm)]
+
+        # Allocation peak of one cold call; separate pass, tracemalloc slows code down.
+        # Covers Python and NumPy buffers; Pillow and MuPDF allocate outside its view.
+        reset_caches()
+        tracemalloc.start()
+        try:
+            _timed(case.call)
+            _, alloc_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result.update({
+            "first_s": round(first, 6),
+            "cold": summarize(cold_samples),
+            "warm": summarize(warm_samples),
+            "alloc_peak_mb": round(alloc_peak / (1024 * 1024), 2),
+        })
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["rss_peak_mb"] = _max_rss_mb()
+    result["rss_growth_mb"] = round(result["rss_peak_mb"] - rss_before, 1)
+    return result
+
+
+def _git_revision():
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(cases, cold=3, warm=10, progress=print, options=None):
+    from utils import image_processing
+    # The disk tier would turn cold runs into disk reads (and keep results between runs)
+    image_processing._DISK_CACHE = None
+    results = []
+    for case in cases:
+        progress(f"  {case.key} ...")
+        results.append(run_case(case, cold, warm))
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": options or {},
+        },
+        "results": results,
+    }
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:9.1f}" if seconds is not None else f"{'-':>9}"
+
+
+def format_report(report):
+    lines = [f"{'case':<48} {'first':>9} {'cold p50':>9} {'warm p50':>9} {'warm p95':>9} {'alloc MB':>9} {'rss MB':>8}"]
+    for r in report["results"]:
+        key = f"{r['name']}[{r['fixture']}]"
+        if "error" in r:
+            lines.append(f"{key:<48} ERROR {r['error']}")
+            continue
+        lines.append(f"{key:<48} {_ms(r['first_s'])} {_ms(r['cold']['p50_s'])} {_ms(r['warm']['p50_s'])} "
+                     f"{_ms(r['warm']['p95_s'])} {r['alloc_peak_mb']:9.1f} {r['rss_peak_mb']:8.0f}")
+    lines.append("(times in ms)")
+    return "\n".join(lines)
+
+
+# --- Regression check between two saved runs ---------------------------------
+
+COMPARED = (("cold", "p50_s"), ("warm", "p50_s"), ("warm", "p95_s"))
+
+
+def compare(base, new, threshold=0.10, min_delta_s=0.002):
+    """
+    Returns (lines, regressions). A metric regresses when it is more than
+    `threshold` slower and at least min_delta_s slower in absolute terms, so
+    sub-millisecond jitter on fast cases doesn't count.
+    """
+    index = {(r["name"], r["fixture"]): r for r in base["results"]}
+    lines = [f"{'case':<48} {'metric':<9} {'base ms':>9} {'new ms':>9} {'change':>8}"]
+    regressions = 0
+    for r in new["results"]:
+        old = index.get((r["name"], r["fixture"]))
+        key = f"{r['name']}[{r['fixture']}]"
+        if old is None or "error" in old or "error" in r:
+            lines.append(f"{key:<48} {'skipped':<9} {'(new case or error)':>28}")
+            continue
+        for phase, stat in COMPARED:
+            before, after = old[phase][stat], r[phase][stat]
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if change > threshold and after - before >= min_delta_s:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif change < -threshold and before - after >= min_delta_s:
+                flag = "  faster"
+            lines.append(f"{key:<48} {phase + ' ' + stat[:3]:<9} {_ms(before)} {_ms(after)} {change:+8.1%}{flag}")
+    return lines, regressions
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
@@ -40,6 +40,7 @@ export default function BusinessCardPage() {
     })
 
     const timeoutRef = useRef<NodeJS.Timeout | null>(null)
+    const previewEtagRef = useRef<string | null>(null)
 
     // Initial Address Split Logic
     useEffect(() => {
@@ -85,8 +86,11 @@ export default function BusinessCardPage() {
         Object.entries(formData).forEach(([key, val]) => form.append(key, String(val)))
 
         try {
-            const res = await fetch(getApiUrl('/api/preview-business-card'), { method: 'POST', body: form })
+            const headers: HeadersInit = previewEtagRef.current ? { 'If-None-Match': previewEtagRef.current } : {}
+            const res = await fetch(getApiUrl('/api/preview-business-card'), { method: 'POST', body: form, headers })
+            // 304: the preview on screen is already this render
             if (res.ok) {
+                previewEtagRef.current = res.headers.get('ETag')
                 const blob = await res.blob()
                 setPreviewUrl(URL.createObjectURL(blob))
             }
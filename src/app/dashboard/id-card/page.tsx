@@ -46,6 +46,9 @@ export default function IDCardPage() {
     })
 
     const timeoutRef = useRef<NodeJS.Timeout | null>(null)
+    // Token for the server-side render behind the last preview; download redeems it
+    const renderTokenRef = useRef<string | null>(null)
+    const previewEtagRef = useRef<string | null>(null)
 
     // Handle inputs
     const handleChange = (key: string, value: any) => {
@@ -75,10 +78,14 @@ export default function IDCardPage() {
         try {
             const res = await fetch(getApiUrl('/api/preview-id-card'), {
                 method: 'POST',
-                body: form
+                body: form,
+                headers: previewEtagRef.current ? { 'If-None-Match': previewEtagRef.current } : {}
             })
 
+            // 304: the preview on screen is already this render
             if (res.ok) {
+                previewEtagRef.current = res.headers.get('ETag')
+                renderTokenRef.current = res.headers.get('X-Render-Token')
                 const blob = await res.blob()
                 const url = URL.createObjectURL(blob)
                 setPreviewUrl(url)
@@ -99,6 +106,7 @@ export default function IDCardPage() {
         Object.entries(formData).forEach(([key, val]) => {
             form.append(key, String(val))
         })
+        if (renderTokenRef.current) form.append('render_token', renderTokenRef.current)
 
         try {
             const res = await fetch(getApiUrl('/api/generate-id-card'), {
@@ -1,6 +1,6 @@
 'use client'
 
-import { useState } from 'react'
+import { useState, useRef } from 'react'
 import { Button } from '@/components/ui/button'
 import { Input } from '@/components/ui/input'
 import { Label } from '@/components/ui/label'
@@ -13,6 +13,7 @@ export default function WelcomePage() {
     const [file, setFile] = useState<File | null>(null)
     const [previewUrl, setPreviewUrl] = useState<string | null>(null)
     const [loading, setLoading] = useState(false)
+    const etagRef = useRef<string | null>(null)
 
     const [formData, setFormData] = useState({
         first_name: "John",
@@ -39,10 +40,13 @@ export default function WelcomePage() {
         try {
             const res = await fetch(getApiUrl('/api/generate-welcome'), {
                 method: 'POST',
-                body: form
+                body: form,
+                headers: etagRef.current ? { 'If-None-Match': etagRef.current } : {}
             })
 
+            // 304: the image on screen is already this render
             if (res.ok) {
+                etagRef.current = res.headers.get('ETag')
                 const blob = await res.blob()
                 const url = URL.createObjectURL(blob)
                 setPreviewUrl(url)
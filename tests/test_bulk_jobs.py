@@ -0,0 +1,50 @@
+import random
+import time
+import zipfile
+import fitz
+from benchmarks.fixtures import SETTINGS, encode, portrait
+from utils import bulk_jobs, settings_manager
+
+COLUMNS = "first_name,last_name,title,id_number,doj,emergency_no,blood_group,office_address"
+
+
+def _run_job(monkeypatch, tmp_path, output, count, missing=()):
+    monkeypatch.setattr(settings_manager, "SETTINGS_FILE", SETTINGS)
+    monkeypatch.setenv("BULK_JOB_DIR", str(tmp_path))
+    monkeypatch.setenv("BULK_WORKERS", "4")
+    monkeypatch.setattr(bulk_jobs, "_PART_CARDS", 4)
+    # Random per-row delay so rows finish out of CSV order
+    process = bulk_jobs.process_id_photo
+    rng = random.Random(7)
+    delays = [rng.random() * 0.05 for _ in range(count)]
+
+    def slow(contents, *args):
+        time.sleep(delays.pop())
+        return process(contents, *args)
+
+    monkeypatch.setattr(bulk_jobs, "process_id_photo", slow)
+
+    job = bulk_jobs.create_job(output, use_ai_removal=False)
+    rows = [f"N{i},L{i},Eng,E{i:03d},2024-01-01,99,O+,Addr" for i in range(1, count + 1)]
+    with open(job.csv_path, "w") as f:
+        f.write("\n".join([COLUMNS] + rows) + "\n")
+    photo = encode(portrait(240, 320), "JPEG")
+    with zipfile.ZipFile(job.zip_path, "w") as archive:
+        for i in range(1, count + 1):
+            if i not in missing:
+                archive.writestr(f"E{i:03d}.jpg", photo)
+    job.run()
+    return job
+
+
+def test_merged_pdf_follows_csv_order(monkeypatch, tmp_path):
+    job = _run_job(monkeypatch, tmp_path, "pdf", 11, missing={5})
+    try:
+        status = job.to_dict()
+        assert status["status"] == "done"
+        assert (status["completed"], status["failed"]) == (10, 1)
+        with fitz.open(job.merged_path) as doc:
+            ids = [w for page in doc for w in page.get_text().split() if w.startswith("E0")]
+        assert ids == [f"E{i:03d}" for i in range(1, 12) if i != 5]
+    finally:
+        job.cleanup()
@@ -0,0 +1,39 @@
+import pytest
+from benchmarks.fixtures import SETTINGS
+from utils import settings_manager
+from utils.imposition import Imposer
+from utils.layout import get_layout_plan
+
+
+@pytest.fixture
+def plan(monkeypatch):
+    monkeypatch.setattr(settings_manager, "SETTINGS_FILE", SETTINGS)
+    return get_layout_plan("id_card")
+
+
+def _pairs(imposer):
+    return [(imposer._cell(i, False), imposer._cell(i, True)) for i in range(imposer.per_sheet)]
+
+
+@pytest.mark.parametrize("landscape", [False, True])
+def test_long_edge_backs_sit_behind_fronts(plan, landscape):
+    imposer = Imposer(plan, sheet="A4", landscape=landscape, flip="long")
+    assert (imposer.sheet_w > imposer.sheet_h) == landscape
+    assert imposer.cols > 1 and imposer.rows > 1
+    for front, back in _pairs(imposer):
+        if landscape:
+            # Flipped over the top edge: same column, mirrored row
+            assert back.x0 == pytest.approx(front.x0)
+            assert back.y0 == pytest.approx(imposer.sheet_h - front.y1)
+        else:
+            # Flipped over the side edge: same row, mirrored column
+            assert back.x0 == pytest.approx(imposer.sheet_w - front.x1)
+            assert back.y0 == pytest.approx(front.y0)
+
+
+@pytest.mark.parametrize("landscape", [False, True])
+def test_short_edge_backs_are_rotated(plan, landscape):
+    imposer = Imposer(plan, sheet="A4", landscape=landscape, flip="short")
+    for front, back in _pairs(imposer):
+        assert back.x0 == pytest.approx(imposer.sheet_w - front.x1)
+        assert back.y0 == pytest.approx(imposer.sheet_h - front.y1)
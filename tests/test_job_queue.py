@@ -0,0 +1,56 @@
+import time
+import pytest
+from benchmarks.fixtures import fixture
+from utils.job_queue import JobCancelled, JobQueue
+
+PARAMS = {"first_name": "A", "last_name": "B", "title": "T", "doj": "2024-03-01"}
+
+
+def _photo(n):
+    # Trailing bytes after the JPEG's end marker: same pixels, but a distinct
+    # content key, so no worker-side cache shortens the run
+    return fixture("phone") + b"\x00" * n
+
+
+@pytest.fixture(scope="module")
+def queue():
+    q = JobQueue(1, 60)
+    q.prewarm()
+    yield q
+    q.shutdown()
+
+
+def _wait_running(job, timeout=30):
+    deadline = time.time() + timeout
+    while job.status == "queued" and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.status == "running"
+
+
+def test_cancel_before_start(queue):
+    first = queue.submit("welcome_image", PARAMS, _photo(1))
+    second = queue.submit("welcome_image", PARAMS, _photo(2))
+    # One worker: the second job is still waiting behind the first
+    assert queue.cancel(second.id).status == "cancelled"
+
+    first.future.result(timeout=60)
+    assert first.status == "done"
+    assert second.status == "cancelled"
+    assert second.started is None and second.result is None
+
+
+def test_cancel_while_running_frees_the_worker(queue):
+    start = time.time()
+    queue.submit("welcome_image", PARAMS, _photo(3)).future.result(timeout=60)
+    full_run = time.time() - start
+
+    job = queue.submit("welcome_image", PARAMS, _photo(4))
+    _wait_running(job)
+    start = time.time()
+    queue.cancel(job.id)
+    # One worker: the noop only runs once the cancelled job has let go of it
+    queue.submit("noop").future.result(timeout=60)
+
+    assert isinstance(job.future.exception(), JobCancelled)
+    assert job.status == "cancelled"
+    assert time.time() - start < full_run
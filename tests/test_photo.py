@@ -0,0 +1,28 @@
+import io
+import fitz
+from PIL import Image
+from utils.photo import Photo
+
+
+def _render_center(pixmap=None, stream=None):
+    doc = fitz.open()
+    page = doc.new_page(width=20, height=20)
+    page.insert_image(page.rect, pixmap=pixmap, stream=stream)
+    return page.get_pixmap().pixel(10, 10)
+
+
+def test_to_pixmap_partial_alpha_matches_png_stream():
+    image = Image.new("RGBA", (20, 20), (128, 128, 128, 128))
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+
+    expected = _render_center(stream=buf.getvalue())
+    actual = _render_center(pixmap=Photo(image, "partial-alpha").to_pixmap())
+
+    assert expected != (255, 255, 255)
+    assert all(abs(a - e) <= 1 for a, e in zip(actual, expected))
+
+
+def test_to_pixmap_opaque_rgb():
+    image = Image.new("RGB", (20, 20), (200, 40, 10))
+    assert _render_center(pixmap=Photo(image, "opaque").to_pixmap()) == (200, 40, 10)
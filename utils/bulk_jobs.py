@@ -0,0 +1,377 @@
+import os
+import csv
+import time
+import uuid
+import shutil
+import zipfile
+import tempfile
+import threading
+import fitz
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.settings_manager import get_setting
+from utils.image_processing import process_id_photo, get_rembg_pool
+from utils.pdf_generator import generate_id_card_pdf, id_card_fields
+from utils.layout import get_layout_plan
+from utils.template_cache import open_template
+from utils.imposition import Imposer
+
+# CSV columns understood by the bulk job; missing optional columns render empty
+ID_CARD_COLUMNS = ("first_name", "last_name", "title", "id_number", "doj",
+                   "emergency_no", "blood_group", "office_address")
+REQUIRED_COLUMNS = ("first_name", "id_number")
+PHOTO_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+_JOB_TTL_SECONDS = 3600 # Finished jobs (and their files) are kept this long
+_PART_CARDS = 50 # Cards per part file of a merged ("pdf"/"sheets") output
+_LOCK = threading.Lock()
+_JOBS = {} # Key: job id, Value: BulkJob
+
+
+def _job_root():
+    root = os.environ.get("BULK_JOB_DIR") or os.path.join(tempfile.gettempdir(), "trikon-bulk")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def _worker_count(model):
+    """Workers per job: performance.bulk_workers, else one per rembg session."""
+    configured = int(os.environ.get("BULK_WORKERS") or get_setting("performance", "bulk_workers") or 0)
+    return configured or get_rembg_pool(model).size
+
+
+def _photo_index(archive):
+    """Maps lower-cased file stem -> member name for the photos in the ZIP."""
+    index = {}
+    for info in archive.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith("__MACOSX/"):
+            continue
+        stem, ext = os.path.splitext(os.path.basename(name))
+        if ext.lower() in PHOTO_EXTENSIONS:
+            index[stem.strip().lower()] = name
+    return index
+
+
+def _safe_name(value):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in value) or "card"
+
+
+class _PartWriter:
+    """
+    Merged output written in parts: pages go into a small document that is
+    saved to the job dir every `part_cards` cards, and the parts are appended
+    to the final file one at a time with incremental saves. Only one part is
+    in memory at once; each part embeds the template once.
+    """
+
+    def __init__(self, workdir, part_cards=_PART_CARDS):
+        self.workdir = workdir
+        self.part_cards = part_cards
+        self.doc = fitz.open()
+        self.parts = []
+        self._cards = 0
+
+    def added(self, cards=1):
+        self._cards += cards
+        if self._cards >= self.part_cards:
+            self._flush()
+
+    def _flush(self):
+        if len(self.doc):
+            path = os.path.join(self.workdir, f"part-{len(self.parts):05d}.pdf")
+            self.doc.save(path, garbage=3, deflate=True)
+            self.parts.append(path)
+        self.doc.close()
+        self.doc = fitz.open()
+        self._cards = 0
+
+    def finish(self, path):
+        """Joins the parts into path; returns it, or None when nothing was written."""
+        self._flush()
+        if not self.parts:
+            return None
+        os.replace(self.parts[0], path)
+        for part in self.parts[1:]:
+            with fitz.open(path) as out, fitz.open(part) as src:
+                out.insert_pdf(src)
+                out.saveIncr()
+            os.remove(part)
+        return path
+
+
+class BulkJob:
+    """
+    One CSV + photo ZIP run. Rows are processed by a thread pool with a bounded
+    number in flight; each card is written to the job's temp dir as soon as it
+    is done, so memory holds only the cards being worked on. Merged outputs
+    ("pdf", "sheets") take the cards in CSV order and are written in parts.
+    """
+
+    def __init__(self, output, use_auto_crop, use_ai_removal, model, imposition=None):
+        self.id = uuid.uuid4().hex
+        self.output = output  # "zip": one PDF per card, "pdf": one merged PDF, "sheets": imposed N-up
+        self.imposition = imposition or {} # Imposer options for "sheets"
+        self.use_auto_crop = use_auto_crop
+        self.use_ai_removal = use_ai_removal
+        self.model = model
+        self.workdir = tempfile.mkdtemp(prefix=f"{self.id[:8]}-", dir=_job_root())
+        self.csv_path = os.path.join(self.workdir, "input.csv")
+        self.zip_path = os.path.join(self.workdir, "photos.zip")
+        self.status = "queued"
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+        self.errors = [] # {"row", "id_number", "error"}
+        self.results = [] # (arcname, path) in completion order
+        self.merged_path = None
+        self.created = time.time()
+        self.finished = None
+        self._cond = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        with self._cond:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "output": self.output,
+                "total": self.total,
+                "completed": self.completed,
+                "failed": self.failed,
+                "errors": list(self.errors),
+                "elapsed_seconds": round((self.finished or time.time()) - self.created, 2),
+            }
+
+    def _update(self, **changes):
+        with self._cond:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self._cond.notify_all()
+
+    def _read_rows(self):
+        with open(self.csv_path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            header = {h.strip() for h in (reader.fieldnames or [])}
+            missing = [c for c in REQUIRED_COLUMNS if c not in header]
+            if missing:
+                raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+            for row in reader:
+                row = {k.strip(): (v or "").strip() for k, v in row.items() if k}
+                if any(row.values()):
+                    yield row
+
+    def _process(self, row_no, row, archive, index, archive_lock):
+        """Crop -> matte -> PDF for one row. Runs on a pool thread."""
+        id_number = row.get("id_number", "")
+        member = index.get(id_number.lower())
+        if member is None:
+            raise ValueError(f"No photo named {id_number} in the ZIP")
+        with archive_lock:
+            contents = archive.read(member)
+        photo = process_id_photo(contents, self.use_auto_crop, self.use_ai_removal, self.model)
+        if photo is None:
+            raise ValueError("Unsupported image")
+        fields = {c: row.get(c, "") for c in ID_CARD_COLUMNS}
+        if self.output in ("pdf", "sheets"):
+            return fields, photo  # drawn into the merged document by the job thread
+        pdf_bytes = generate_id_card_pdf(
+            fields["first_name"], fields["last_name"], fields["title"], fields["id_number"], fields["doj"],
+            photo, fields["emergency_no"], fields["blood_group"], fields["office_address"]
+        )
+        if pdf_bytes is None:
+            raise ValueError("PDF generation failed")
+        path = os.path.join(self.workdir, f"{row_no:05d}.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+        return f"ID_{_safe_name(id_number)}.pdf", path
+
+    def run(self):
+        self._update(status="running")
+        writer = imposer = template = plan = None
+        try:
+            rows = list(self._read_rows())
+            self._update(total=len(rows))
+            if self.output in ("pdf", "sheets"):
+                writer = _PartWriter(self.workdir, _PART_CARDS)
+            if self.output == "sheets":
+                imposer = Imposer(get_layout_plan("id_card"), **self.imposition)
+            elif self.output == "pdf":
+                # One shared template doc: insert_pdf reuses its objects for every card of a part
+                plan = get_layout_plan("id_card")
+                template = open_template(plan.template, fallback=plan.fallback)
+
+            workers = _worker_count(self.model)
+            archive_lock = threading.Lock()
+            with zipfile.ZipFile(self.zip_path) as archive, ThreadPoolExecutor(max_workers=workers) as pool:
+                index = _photo_index(archive)
+                pending = {}
+                # Merged outputs follow CSV order: finished rows wait here for earlier ones
+                ready = {} # Key: row number, Value: (future, row)
+                next_row = 1
+                rows_iter = iter(enumerate(rows, start=1))
+                while True:
+                    # Keep at most 2 rows per worker in flight or waiting
+                    while len(pending) + len(ready) < workers * 2:
+                        item = next(rows_iter, None)
+                        if item is None:
+                            break
+                        row_no, row = item
+                        pending[pool.submit(self._process, row_no, row, archive, index, archive_lock)] = (row_no, row)
+                    if not pending:
+                        break
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        row_no, row = pending.pop(future)
+                        if writer is None:
+                            self._collect(future, row_no, row)
+                        else:
+                            ready[row_no] = (future, row)
+                    while next_row in ready:
+                        future, row = ready.pop(next_row)
+                        self._collect(future, next_row, row, writer, imposer, template, plan)
+                        next_row += 1
+
+            if writer is not None:
+                if imposer is not None:
+                    imposer.impose_into(writer.doc, final=True)
+                self.merged_path = writer.finish(os.path.join(self.workdir, "id_cards.pdf"))
+            self._update(status="done", finished=time.time())
+        except Exception as e:
+            print(f"Bulk job {self.id} failed: {e}")
+            with self._cond:
+                self.errors.append({"row": None, "id_number": None, "error": str(e)})
+            self._update(status="failed", finished=time.time())
+
+    def _collect(self, future, row_no, row, writer=None, imposer=None, template=None, plan=None):
+        try:
+            result = future.result()
+            if writer is not None:
+                fields, photo = result
+                bound = id_card_fields(*(fields[c] for c in ID_CARD_COLUMNS))
+                if imposer is not None:
+                    imposer.add(bound, {"photo": photo})
+                    imposer.impose_into(writer.doc)
+                else:
+                    doc = writer.doc
+                    base = len(doc)
+                    doc.insert_pdf(template)
+                    for page_no in plan.pages:
+                        if page_no < len(template):
+                            plan.render_page(doc[base + page_no], page_no, bound, {"photo": photo})
+                writer.added()
+            with self._cond:
+                if writer is None:
+                    self.results.append(result)
+                self.completed += 1
+                self._cond.notify_all()
+        except Exception as e:
+            with self._cond:
+                self.failed += 1
+                self.errors.append({"row": row_no, "id_number": row.get("id_number"), "error": str(e)})
+                self._cond.notify_all()
+
+    def wait_for(self, count, timeout=1.0):
+        """Blocks until more than `count` results exist or the job has finished."""
+        with self._cond:
+            if len(self.results) <= count and not self.done:
+                self._cond.wait(timeout)
+            return list(self.results[count:]), self.done
+
+    def cleanup(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class _ZipSink:
+    """Write-only file object; ZipFile falls back to data descriptors without tell()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(job, chunk_size=1 << 20):
+    """
+    Yields a ZIP of the job's PDFs as they complete, reading each card from
+    disk. Ends with errors.csv when some rows failed.
+    """
+    sink = _ZipSink()
+    sent = 0
+    # PDFs are already compressed; deflating them again costs CPU for ~nothing
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        while True:
+            ready, finished = job.wait_for(sent)
+            for arcname, path in ready:
+                with open(path, "rb") as src, archive.open(arcname, "w") as dst:
+                    while True:
+                        block = src.read(chunk_size)
+                        if not block:
+                            break
+                        dst.write(block)
+                        yield sink.drain()
+                sent += 1
+            if finished and not ready:
+                break
+        if job.errors:
+            lines = ["row,id_number,error"] + [
+                f'{e["row"] or ""},{e["id_number"] or ""},"{e["error"].replace(chr(34), chr(39))}"' for e in job.errors
+            ]
+            archive.writestr("errors.csv", "\n".join(lines) + "\n")
+    yield sink.drain()
+
+
+def iter_file(path, chunk_size=1 << 20):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            yield block
+
+
+def _purge_jobs():
+    now = time.time()
+    with _LOCK:
+        expired = [j for j in _JOBS.values() if j.finished and now - j.finished > _JOB_TTL_SECONDS]
+        for job in expired:
+            del _JOBS[job.id]
+    for job in expired:
+        job.cleanup()
+
+
+def create_job(output="zip", use_auto_crop=True, use_ai_removal=True, model=None, imposition=None):
+    """Registers a job; the caller writes job.csv_path / job.zip_path, then start_job()."""
+    if output not in ("zip", "pdf", "sheets"):
+        raise ValueError(f"Unknown output: {output}. Use 'zip', 'pdf' or 'sheets'")
+    if output == "sheets":
+        # Validate sheet/grid options before accepting uploads
+        Imposer(get_layout_plan("id_card"), **(imposition or {}))
+    _purge_jobs()
+    job = BulkJob(output, use_auto_crop, use_ai_removal, model, imposition)
+    with _LOCK:
+        _JOBS[job.id] = job
+    return job
+
+
+def start_job(job):
+    threading.Thread(target=job.run, name=f"bulk-{job.id[:8]}", daemon=True).start()
+    return job
+
+
+def get_job(job_id):
+    _purge_jobs()
+    with _LOCK:
+        return _JOBS.get(job_id)
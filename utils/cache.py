@@ -0,0 +1,220 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+try:
+    import fcntl
+except ImportError:  # Windows: eviction runs without the cross-process lock
+    fcntl = None
+
+
+def _namespace(key):
+    """Returns the prefix of a cache key, e.g. 'bg_' for 'bg_<md5>'."""
+    head, sep, _ = key.rpartition("_")
+    return head + sep if sep else ""
+
+
+class LRUByteCache:
+    """
+    Thread-safe LRU cache with a total byte budget.
+    Values are sized with `sizeof` (len() by default) and the least recently
+    used entries are evicted once the budget is exceeded.
+    Hit/miss/eviction counters are kept per key prefix (bg_, crop_id_, ...).
+    """
+
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max(0, int(max_bytes))
+        self._sizeof = sizeof
+        self._data = OrderedDict()  # Key: cache key, Value: (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _counter(self, key):
+        ns = _namespace(key)
+        if ns not in self._stats:
+            self._stats[ns] = {"hits": 0, "misses": 0, "evictions": 0}
+        return self._stats[ns]
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._counter(key)["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self._counter(key)["hits"] += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            # Never let a single oversized value flush the whole cache
+            if size > self.max_bytes:
+                return False
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted_key, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self._counter(evicted_key)["evictions"] += 1
+            return True
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns a snapshot of usage and per-prefix counters."""
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "namespaces": {ns: dict(c) for ns, c in self._stats.items()},
+            }
+
+
+class DiskCache:
+    """
+    Content-addressed file cache shared by all worker processes.
+    'bg_<md5>' is stored as <root>/bg/<md5[:2]>/<md5>.png. Writes go to a temp
+    file and are renamed into place, so readers never see partial files.
+    Once the directory grows past max_bytes the least recently used files are
+    removed under an exclusive lock file.
+    """
+
+    def __init__(self, root, max_bytes, suffix=".png"):
+        self.root = root
+        self.max_bytes = max(0, int(max_bytes))
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._approx_bytes = None  # Lazily initialised from a directory scan
+        self._stats = {}
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        ns, _, digest = key.rpartition("_")
+        return os.path.join(self.root, ns or "default", digest[:2], digest + self.suffix)
+
+    def _counter(self, key):
+        ns = _namespace(key)
+        if ns not in self._stats:
+            self._stats[ns] = {"hits": 0, "misses": 0, "evictions": 0}
+        return self._stats[ns]
+
+    def _count(self, key, field, n=1):
+        with self._lock:
+            self._counter(key)[field] += n
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self._count(key, "misses")
+            return None
+        try:
+            # Refresh mtime so eviction treats it as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        self._count(key, "hits")
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return False
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            print(f"Disk cache write failed: {e}")
+            return False
+
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_size()
+            else:
+                self._approx_bytes += len(data)
+            over_budget = self._approx_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+        return True
+
+    def _entries(self):
+        """Yields (path, size, mtime) for every cached file."""
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # Removed by another worker meanwhile
+                yield path, st.st_size, st.st_mtime
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Removes least recently used files until 90% of the budget is free."""
+        lock_path = os.path.join(self.root, ".evict.lock")
+        with open(lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                entries = sorted(self._entries(), key=lambda e: e[2])
+                total = sum(size for _, size, _ in entries)
+                target = int(self.max_bytes * 0.9)
+                for path, size, _ in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    # <root>/<ns>/<xx>/<digest>.png -> '<ns>_'
+                    ns_dir = os.path.basename(os.path.dirname(os.path.dirname(path)))
+                    self._count(ns_dir + "_", "evictions")
+                with self._lock:
+                    self._approx_bytes = total
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "root": self.root,
+                "bytes": self._approx_bytes,
+                "max_bytes": self.max_bytes,
+                "namespaces": {ns: dict(c) for ns, c in self._stats.items()},
+            }
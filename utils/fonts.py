@@ -0,0 +1,115 @@
+import os
+import threading
+import fitz
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Font aliases used by the generators -> TTF path relative to the repo root
+FONT_FILES = {
+    "ru-bold": os.path.join("fonts", "Rubik", "static", "Rubik-Bold.ttf"),
+    "ru-reg": os.path.join("fonts", "Rubik", "static", "Rubik-Regular.ttf"),
+    "ru-semi": os.path.join("fonts", "Rubik", "static", "Rubik-SemiBold.ttf"),
+    "ru-italic": os.path.join("fonts", "Rubik", "static", "Rubik-Italic.ttf"),
+    "ru-light": os.path.join("fonts", "Rubik", "static", "Rubik-Light.ttf"),
+    "pop-reg": os.path.join("Poppins", "Poppins-Regular.ttf"),
+    "pop-bold": os.path.join("Poppins", "Poppins-Bold.ttf"),
+    "pop-med": os.path.join("Poppins", "Poppins-Medium.ttf"),
+    "pop-light": os.path.join("Poppins", "Poppins-Light.ttf"),
+    "mont-reg": os.path.join("Montserrat", "static", "Montserrat-Regular.ttf"),
+    "mont-bold": os.path.join("Montserrat", "static", "Montserrat-Bold.ttf"),
+    "mont-light": os.path.join("Montserrat", "static", "Montserrat-Light.ttf"),
+}
+
+_LOCK = threading.Lock()
+_BUFFERS = {} # Key: alias, Value: TTF bytes (None if the file is missing)
+_FONTS = {} # Key: alias, Value: fitz.Font for width measurement
+
+
+def _font_path(alias):
+    rel = FONT_FILES.get(alias)
+    if rel is None:
+        return None
+    for base in (_BASE_DIR, os.getcwd()):
+        path = os.path.join(base, rel)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def get_font_buffer(alias):
+    """Returns the TTF bytes for a font alias, reading the file only once."""
+    if alias in _BUFFERS:
+        return _BUFFERS[alias]
+    with _LOCK:
+        if alias not in _BUFFERS:
+            path = _font_path(alias)
+            data = None
+            if path:
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                except OSError as e:
+                    print(f"Font load failed ({alias}): {e}")
+            _BUFFERS[alias] = data
+        return _BUFFERS[alias]
+
+
+def get_font(alias):
+    """Returns a parsed fitz.Font for an alias, or None if unavailable."""
+    font = _FONTS.get(alias)
+    if font is None:
+        buf = get_font_buffer(alias)
+        if buf is None:
+            return None
+        with _LOCK:
+            font = _FONTS.get(alias)
+            if font is None:
+                font = fitz.Font(fontbuffer=buf)
+                _FONTS[alias] = font
+    return font
+
+
+def register_fonts(page, aliases):
+    """
+    Inserts the given fonts into a page from the in-memory buffers.
+    Returns the set of aliases that were registered.
+    """
+    loaded = set()
+    for alias in aliases:
+        buf = get_font_buffer(alias)
+        if buf is None:
+            continue
+        try:
+            page.insert_font(fontname=alias, fontbuffer=buf)
+            loaded.add(alias)
+        except Exception as e:
+            print(f"Font registration failed ({alias}): {e}")
+    return loaded
+
+
+def text_length(text, alias, fontsize):
+    """Text width in points; measures with Helvetica if the font is unavailable."""
+    font = get_font(alias)
+    if font is None:
+        return fitz.get_text_length(text, fontname="helv", fontsize=fontsize)
+    return font.text_length(text, fontsize=fontsize)
+
+
+def fonts_version(aliases):
+    """mtime/size stamp of the font files behind the aliases (for render cache keys)."""
+    parts = []
+    for alias in sorted(aliases):
+        path = _font_path(alias)
+        try:
+            st = os.stat(path)
+            parts.append(f"{alias}:{st.st_mtime}:{st.st_size}")
+        except (TypeError, OSError):
+            parts.append(f"{alias}:-")
+    return "|".join(parts)
+
+
+def invalidate_fonts():
+    """Drops cached font data, e.g. after an admin uploads a font."""
+    with _LOCK:
+        _BUFFERS.clear()
+        _FONTS.clear()
@@ -3,29 +3,203 @@ from PIL import Image
 import io
 import cv2
 import hashlib
+import os
+import threading
+import onnxruntime as ort
 try:
     import pillow_avif
 except ImportError:
     pass
 from rembg import remove, new_session
-from utils.settings_manager import load_settings
+from rembg.bg import naive_cutout
+from utils.settings_manager import load_settings, get_setting
+from utils.cache import LRUByteCache, DiskCache
+from utils.photo import Photo
+from utils.session_pool import SessionPool
+from utils.metrics import span, INFERENCE
+
+def _cached_size(value):
+    """Sizes cache values: decoded photos, encoded bytes or small crop boxes."""
+    if isinstance(value, Photo):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return 64
+
+def _image_cache_budget():
+    """Byte budget for _IMAGE_CACHE: IMAGE_CACHE_MB env var, else settings."""
+    mb = os.environ.get("IMAGE_CACHE_MB") or get_setting("performance", "image_cache_mb")
+    return int(float(mb) * 1024 * 1024)
+
+def _create_disk_cache():
+    """Optional on-disk tier for BG removal results (IMAGE_CACHE_DIR or settings)."""
+    cache_dir = os.environ.get("IMAGE_CACHE_DIR") or get_setting("performance", "disk_cache_dir")
+    if not cache_dir:
+        return None
+    mb = os.environ.get("IMAGE_CACHE_DISK_MB") or get_setting("performance", "disk_cache_mb")
+    try:
+        return DiskCache(cache_dir, int(float(mb) * 1024 * 1024))
+    except OSError as e:
+        print(f"Disk cache disabled: {e}")
+        return None
+
+def _int_setting(env_name, key):
+    value = os.environ.get(env_name) or get_setting("performance", key)
+    return int(value or 0)
+
+def _rembg_pool_config():
+    """
+    Pool size and per-session ONNX threads. 0 means derive from the CPU count:
+    up to 4 sessions sharing the cores, so concurrent requests don't oversubscribe.
+    """
+    cpus = os.cpu_count() or 1
+    size = _int_setting("REMBG_POOL_SIZE", "rembg_pool_size") or max(1, min(4, cpus // 2))
+    intra = _int_setting("REMBG_INTRA_OP_THREADS", "rembg_intra_op_threads") or max(1, cpus // size)
+    inter = _int_setting("REMBG_INTER_OP_THREADS", "rembg_inter_op_threads") or 1
+    return size, intra, inter
+
+# Matting models selectable per request: model input size, mean and std as
+# used by the matching rembg session. Smaller models trade edge quality for speed.
+MATTING_MODELS = {
+    "u2net": ((320, 320), (0.485, 0.456, 0.406), (0.229, 0.224, 0.225)),
+    "u2netp": ((320, 320), (0.485, 0.456, 0.406), (0.229, 0.224, 0.225)),
+    "silueta": ((320, 320), (0.485, 0.456, 0.406), (0.229, 0.224, 0.225)),
+    "isnet-general-use": ((1024, 1024), (0.5, 0.5, 0.5), (1.0, 1.0, 1.0)),
+}
+
+def resolve_matting_model(model=None, quality=None):
+    """
+    Picks the model for a request: an explicit `model` wins, otherwise
+    quality 'fast' maps to the preview model and anything else to the final one.
+    Raises ValueError for unknown model names.
+    """
+    if model:
+        if model not in MATTING_MODELS:
+            raise ValueError(f"Unknown matting model: {model}")
+        return model
+    key = "preview_model" if quality == "fast" else "final_model"
+    chosen = get_setting("background_removal", key)
+    return chosen if chosen in MATTING_MODELS else "u2net"
 
 # Global sessions and caches to avoid redundant work
-_REMBG_SESSION = None
-_IMAGE_CACHE = {} # Key: Hash, Value: Processed Bytes
+_REMBG_POOLS = {} # Key: model name, Value: SessionPool
+_REMBG_POOL_LOCK = threading.Lock()
+_IMAGE_CACHE = LRUByteCache(_image_cache_budget(), sizeof=_cached_size) # Key: Hash, Value: Photo / crop box
+_DISK_CACHE = _create_disk_cache() # Survives restarts, shared between workers
 
-def get_rembg_session():
-    global _REMBG_SESSION
-    if _REMBG_SESSION is None:
-        print("Creating new rembg session (u2net)...")
-        _REMBG_SESSION = new_session("u2net")
-        print("rembg session created.")
-    return _REMBG_SESSION
+def get_image_cache_stats():
+    """Returns size and per-prefix hit/miss/eviction counters of the image caches."""
+    stats = _IMAGE_CACHE.stats()
+    stats["disk"] = _DISK_CACHE.stats() if _DISK_CACHE else None
+    return stats
+
+def create_rembg_session(model="u2net"):
+    """Creates a rembg session with the pool's thread settings."""
+    _, intra, inter = _rembg_pool_config()
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = intra
+    opts.inter_op_num_threads = inter
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    print(f"Creating new rembg session ({model}, {intra} intra-op threads)...")
+    session = new_session(model, sess_opts=opts)
+    print("rembg session created.")
+    return session
+
+def get_rembg_pool(model="u2net"):
+    """Returns the session pool for a model, creating it on first use."""
+    pool = _REMBG_POOLS.get(model)
+    if pool is None:
+        with _REMBG_POOL_LOCK:
+            pool = _REMBG_POOLS.get(model)
+            if pool is None:
+                size, _, _ = _rembg_pool_config()
+                # Late-bound so create_rembg_session can be swapped (e.g. for load tests)
+                pool = SessionPool(lambda: create_rembg_session(model), size)
+                _REMBG_POOLS[model] = pool
+    return pool
+
+def get_rembg_pool_stats():
+    """Returns pool occupancy and queue wait times per model."""
+    return {model: pool.stats() for model, pool in list(_REMBG_POOLS.items())}
+
+def warm_up():
+    """
+    Loads every pooled rembg session (preview and final model) and the face
+    detector and runs one dummy inference per session so the first real
+    request doesn't pay for it.
+    """
+    dummy = Image.new("RGB", (64, 64), (255, 255, 255))
+    models = {resolve_matting_model(quality="fast"), resolve_matting_model(quality="high")}
+    for model in models:
+        get_rembg_pool(model).warm(prime=lambda session: remove(dummy, session=session))
+    get_face_cascade()
 
 def get_image_hash(image_bytes: bytes, prefix: str = ""):
     """Generates a unique hash for the image content."""
     return prefix + hashlib.md5(image_bytes).hexdigest()
 
+# Pixel budgets per stage. Decoded uploads keep enough for PDF placement;
+# crops work on at most 1024px wide, mattes on at most 800px wide.
+_DECODE_MAX_PIXELS = 2_000_000
+_CROP_WORK_WIDTH = 1024
+_CROP_WORK_PIXELS = 1024 * 1536
+_MATTE_WIDTH = 800
+_MATTE_PIXELS = 800 * 1200
+
+def _fit_size(width, height, max_width=None, max_pixels=None):
+    """Largest size within max_width and a total pixel budget, keeping the aspect ratio."""
+    scale = 1.0
+    if max_width and width > max_width:
+        scale = max_width / width
+    if max_pixels and width * height * scale * scale > max_pixels:
+        scale = (max_pixels / (width * height)) ** 0.5
+    if scale >= 1.0:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def _downscale(image, max_width=None, max_pixels=None):
+    """
+    Downscales a PIL image to fit max_width and max_pixels. reducing_gap lets
+    Pillow reduce() by an integer factor (a cheap box filter) before the final
+    LANCZOS pass, so the expensive filter only sees ~2x the output size.
+    """
+    size = _fit_size(*image.size, max_width, max_pixels)
+    if size == image.size:
+        return image
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+@span("decode_image")
+def decode_image(image_bytes: bytes):
+    """
+    Decodes upload bytes once into a Photo (RGB or RGBA).
+    Handles AVIF and WebP if plugins are present. Returns None on failure.
+    Large uploads are cut to the decode pixel budget: JPEGs in the DCT domain
+    (see Photo.from_bytes), the rest by a reducing resize.
+    """
+    try:
+        photo = Photo.from_bytes(image_bytes, _DECODE_MAX_PIXELS)
+        # The budget is fixed, so the upload's key still identifies these pixels
+        photo.image = _downscale(photo.image, max_pixels=_DECODE_MAX_PIXELS)
+        return photo
+    except Exception as e:
+        print(f"Decode failed: {e}")
+        return None
+
+def load_image(image_bytes, max_width=1024, max_pixels=None):
+    """Decodes and downscales upload bytes, returning a Photo (no re-encode), or None."""
+    photo = decode_image(image_bytes)
+    if photo is None:
+        return None
+    return _resize_photo(photo, max_width, max_pixels)
+
+def _resize_photo(photo, max_width=None, max_pixels=None):
+    """Downscaled copy of a Photo within max_width and max_pixels."""
+    resized = _downscale(photo.image, max_width, max_pixels)
+    if resized is photo.image:
+        return photo
+    stage = f"resize{max_width}" + (f"p{max_pixels}" if max_pixels else "")
+    return photo.derive(resized, stage)
+
 def normalize_image(image_bytes: bytes) -> bytes:
     """
     Ensures image is in a format compatible with OpenCV (PNG/JPEG).
@@ -47,193 +221,369 @@ def normalize_image(image_bytes: bytes) -> bytes:
 def resize_image_bytes(image_bytes, max_width=1024):
     """
     Resizes image bytes to a maximum width to speed up processing.
-    Returns bytes.
+    Returns bytes. In-process callers should use load_image and keep the Photo.
     """
     try:
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Calculate new dimensions
-        width, height = image.size
-        if width > max_width:
-            ratio = max_width / width
-            new_height = int(height * ratio)
-            image = image.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Save back to bytes
-            buf = io.BytesIO()
-            # Convert to RGB if necessary (e.g. for JPEG saving) BUT we want to keep transparency if PNG
-            if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
-                 format = "PNG"
-            else:
-                 format = "JPEG"
-                 
-            image.save(buf, format=format, quality=85)
-            return buf.getvalue()
-        
-        return image_bytes
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            if img.width <= max_width:
+                return image_bytes
     except Exception as e:
         print(f"Resize failed: {e}")
         return image_bytes
+    photo = load_image(image_bytes, max_width)
+    if photo is None:
+        return image_bytes
+    buf = io.BytesIO()
+    # Keep transparency as PNG, everything else as JPEG
+    if photo.image.mode == "RGBA":
+        photo.image.save(buf, format="PNG")
+    else:
+        photo.image.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
 
-def remove_background(image_bytes):
-    """Local background removal using rembg with session support."""
-    # Normalize first
-    image_bytes = normalize_image(image_bytes)
-    
-    img_hash = get_image_hash(image_bytes, "bg_")
-    if img_hash in _IMAGE_CACHE:
+def _matte_key(photo, model):
+    """Cache key per model; u2net keeps the plain bg_ namespace."""
+    prefix = "bg_" if model == "u2net" else f"bg_{model}_"
+    return prefix + photo.key
+
+def _cached_matte(photo, model):
+    """Looks up a BG removal result in memory, then on disk."""
+    img_hash = _matte_key(photo, model)
+    cached = _IMAGE_CACHE.get(img_hash)
+    if cached is not None:
         print(f"Cache hit for BG removal")
-        return _IMAGE_CACHE[img_hash]
+        return cached
+    if _DISK_CACHE:
+        cached = _DISK_CACHE.get(img_hash)
+        if cached is not None:
+            print("Disk cache hit for BG removal")
+            result = photo.derive(Image.open(io.BytesIO(cached)), f"bg:{model}")
+            result.image.load()
+            _IMAGE_CACHE.put(img_hash, result)
+            return result
+    return None
+
+def _store_matte(photo, image, model):
+    result = photo.derive(image, f"bg:{model}")
+    img_hash = _matte_key(photo, model)
+    _IMAGE_CACHE.put(img_hash, result)
+    if _DISK_CACHE:
+        _DISK_CACHE.put(img_hash, result.to_png())
+    return result
+
+@span("remove_background")
+def remove_background_photo(photo, model=None):
+    """
+    Local background removal using rembg with session support. Returns a Photo.
+    `model` defaults to the final (high quality) model from settings.
+    """
+    model = model or resolve_matting_model()
+    cached = _cached_matte(photo, model)
+    if cached is not None:
+        return cached
         
     try:
         # Optimize: Resize before processing to significantly boost speed
-        optimized_bytes = resize_image_bytes(image_bytes, max_width=800)
-        session = get_rembg_session()
-        result = remove(optimized_bytes, session=session)
-        
-        # Cache the result
-        _IMAGE_CACHE[img_hash] = result
-        return result
+        optimized = _resize_photo(photo, _MATTE_WIDTH, _MATTE_PIXELS)
+        with get_rembg_pool(model).session() as session:
+            with INFERENCE.time(model=model, batch=1):
+                result = remove(optimized.image, session=session)
+        return _store_matte(photo, result, model)
     except Exception as e:
         print(f"Local background removal failed: {e}")
         return None
 
+def _model_input(img, model):
+    """Same preprocessing as rembg's BaseSession.normalize, as a CHW float32 array."""
+    size, mean, std = MATTING_MODELS[model]
+    arr = np.asarray(img.convert("RGB").resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0), dtype=np.float32)
+    arr = arr / max(float(arr.max()), 1e-6)
+    arr = (arr - np.array(mean, dtype=np.float32)) / np.array(std, dtype=np.float32)
+    return arr.transpose((2, 0, 1))
+
+def _predict_masks(session, images, batch_size, model):
+    """Runs the model on stacked inputs, batch_size images per ONNX call."""
+    inner = session.inner_session
+    model_input = inner.get_inputs()[0]
+    # Some exports pin the batch dimension; respect it
+    if isinstance(model_input.shape[0], int) and model_input.shape[0] > 0:
+        batch_size = model_input.shape[0]
+    
+    masks = []
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        batch = np.stack([_model_input(img, model) for img in chunk])
+        with INFERENCE.time(model=model, batch=len(chunk)):
+            pred = inner.run(None, {model_input.name: batch})[0][:, 0, :, :]
+        for p, img in zip(pred, chunk):
+            p = (p - p.min()) / max(float(p.max() - p.min()), 1e-6)
+            mask = Image.fromarray((p.clip(0, 1) * 255).astype("uint8"), mode="L")
+            masks.append(mask.resize(img.size, Image.Resampling.LANCZOS))
+    return masks
+
+@span("remove_background_batch")
+def remove_background_photos(photos, batch_size=None, model=None):
+    """
+    Batch background removal: uncached photos are resized to the model input,
+    stacked and run through the shared session in as few calls as possible.
+    Returns a list of Photo/None in input order; failures are isolated per item.
+    """
+    model = model or resolve_matting_model()
+    if batch_size is None:
+        batch_size = int(get_setting("performance", "rembg_batch_size"))
+    results = [None] * len(photos)
+    pending = []
+    for i, photo in enumerate(photos):
+        if photo is None:
+            continue
+        cached = _cached_matte(photo, model)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append(i)
+    if not pending:
+        return results
+
+    try:
+        optimized = [_resize_photo(photos[i], _MATTE_WIDTH, _MATTE_PIXELS).image for i in pending]
+        with get_rembg_pool(model).session() as session:
+            masks = _predict_masks(session, optimized, max(1, batch_size), model)
+        for i, img, mask in zip(pending, optimized, masks):
+            results[i] = _store_matte(photos[i], naive_cutout(img, mask), model)
+    except Exception as e:
+        # Fall back to one-by-one so a single bad input can't fail the batch
+        print(f"Batch background removal failed, retrying per image: {e}")
+        for i in pending:
+            if results[i] is None:
+                results[i] = remove_background_photo(photos[i], model)
+    return results
+
+def remove_background_batch(images, model=None):
+    """Bytes-in/bytes-out batch wrapper. Returns PNG bytes or None per input."""
+    photos = [decode_image(image_bytes) for image_bytes in images]
+    return [r.to_png() if r is not None else None for r in remove_background_photos(photos, model=model)]
+
+def remove_background(image_bytes, model=None):
+    """Bytes-in/bytes-out wrapper around remove_background_photo."""
+    photo = decode_image(image_bytes)
+    if photo is None:
+        return None
+    result = remove_background_photo(photo, model)
+    return result.to_png() if result is not None else None
+
+# OpenCV cascades are not safe to share across threads, so keep one per thread
+_THREAD_LOCAL = threading.local()
+
+# Longest side of the grayscale copy the detector runs on
+_DETECT_MAX_SIDE = 480
+
 def get_face_cascade():
-    """Returns the face cascade classifier."""
-    return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    """Returns this thread's face cascade classifier, loading it once."""
+    cascade = getattr(_THREAD_LOCAL, "face_cascade", None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        _THREAD_LOCAL.face_cascade = cascade
+    return cascade
 
-def auto_crop_face(image_bytes):
+def detect_faces(gray, max_side=_DETECT_MAX_SIDE):
     """
-    Smartly crops the image to a Head-to-Chest composition for ID Cards.
-    Target Ratio: ~0.97 (95x98)
+    Runs the cascade on a downscaled copy of a grayscale image and maps the
+    boxes back to full resolution, so cost doesn't grow with upload size.
+    """
+    height, width = gray.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    small = gray
+    if scale < 1.0:
+        small = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    faces = get_face_cascade().detectMultiScale(small, 1.3, 5)
+    return [tuple(int(round(v / scale)) for v in face) for face in faces]
+
+def _largest_face(gray):
+    """Returns the largest detected face as (x, y, w, h), or None."""
+    faces = detect_faces(gray)
+    if len(faces) == 0:
+        return None
+    return max(faces, key=lambda f: f[2] * f[3])
+
+def _work_size(width, height):
+    """Size of the crop work copy of an upload: decode budget, then crop budget."""
+    return _fit_size(*_fit_size(width, height, max_pixels=_DECODE_MAX_PIXELS), _CROP_WORK_WIDTH, _CROP_WORK_PIXELS)
+
+def _face_box(gray, compute_box, work_size):
+    """Detects on `gray` and returns the crop box in work copy coordinates, or () without a face."""
+    face = _largest_face(gray)
+    if face is None:
+        return ()
+    sx, sy = work_size[0] / gray.shape[1], work_size[1] / gray.shape[0]
+    x, y, w, h = face
+    return compute_box((int(x * sx), int(y * sy), int(w * sx), int(h * sy)), *work_size)
+
+def _detection_gray(image_bytes):
+    """
+    Small grayscale copy of an upload for face detection. JPEGs are decoded
+    with DCT scaling (draft), so this costs a fraction of the full decode.
+    Returns the gray array and the full image size.
     """
-    # Normalize first to support AVIF/WebP in CV2
-    image_bytes = normalize_image(image_bytes)
+    img = Image.open(io.BytesIO(image_bytes))
+    width, height = img.size
+    ratio = _DETECT_MAX_SIDE / max(width, height)
+    if ratio < 1:
+        img.draft("L", (max(1, int(width * ratio)), max(1, int(height * ratio))))
+    return np.asarray(img.convert("L")), (width, height)
+
+@span("find_crop_box")
+def find_crop_box(image_bytes, cache_prefix, compute_box):
+    """
+    Crop box for an upload, in the coordinates of its work copy. Needs only
+    the bytes, so it can run while the full image is still being decoded.
+    Shares its cache entry with _crop_photo.
+    """
+    img_hash = cache_prefix + get_image_hash(image_bytes)
+    box = _IMAGE_CACHE.get(img_hash)
+    if box is None:
+        gray, size = _detection_gray(image_bytes)
+        box = _face_box(gray, compute_box, _work_size(*size))
+        _IMAGE_CACHE.put(img_hash, box)
+    return box
+
+def _crop_photo(photo, cache_prefix, compute_box, box=None):
+    """
+    Shared crop stage: resize, find the crop box (cached per input) and crop.
+    compute_box(face, width, height) returns (left, top, right, bottom).
+    A box from find_crop_box skips detection.
+    """
+    # Optimize: Resize first
+    work = _resize_photo(photo, _CROP_WORK_WIDTH, _CROP_WORK_PIXELS)
+
+    if box is not None:
+        # Computed from the upload's header size; may be a pixel off the decoded copy
+        width, height = work.size
+        box = box and (max(0, box[0]), max(0, box[1]), min(width, box[2]), min(height, box[3]))
+    else:
+        img_hash = cache_prefix + photo.key
+        box = _IMAGE_CACHE.get(img_hash)
+        if box is None:
+            box = _face_box(work.gray(), compute_box, work.size)
+            _IMAGE_CACHE.put(img_hash, box)
+        else:
+            print(f"Cache hit for {cache_prefix}")
+
+    if not box:
+        return work # No face found, return original
+    return work.derive(work.image.crop(box), f"{cache_prefix}{box}")
+
+def _id_card_box(face, width, height):
+    x, y, w, h = face
+    settings = load_settings().get("auto_crop", {}).get("id_card", {})
     
-    img_hash = get_image_hash(image_bytes, "crop_id_")
-    if img_hash in _IMAGE_CACHE:
-        print(f"Cache hit for Auto-crop ID")
-        return _IMAGE_CACHE[img_hash]
+    # Widened Ratio to preserve shoulders (more horizontal space)
+    target_ratio = settings.get("target_ratio", 1.2)
+    
+    # Determine crop height - slightly higher headroom
+    crop_top = max(0, int(y - settings.get("top_headroom", 0.7) * h))
+    crop_bottom = min(height, int(y + h + settings.get("bottom_extension", 1.2) * h))
+    crop_h = crop_bottom - crop_top
+    
+    # Determine crop width based on ratio
+    crop_w = int(crop_h * target_ratio)
+    
+    # Centering width around face center
+    face_center_x = x + w // 2
+    crop_left = max(0, face_center_x - crop_w // 2)
+    crop_right = min(width, crop_left + crop_w)
+    
+    # Adjust if we hit edges
+    if crop_right - crop_left < crop_w:
+        crop_left = max(0, crop_right - crop_w)
+    return crop_left, crop_top, crop_right, crop_bottom
 
-    try:
-        # Optimize: Resize first
-        image_bytes = resize_image_bytes(image_bytes, max_width=1024)
-        
-        # Convert bytes to numpy array
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            return image_bytes
+def _welcome_box(face, width, height):
+    x, y, w, h = face
+    face_center_x = x + w // 2
+    
+    # For Welcome Aboard, we want a nice portrait crop.
+    # Let's aim for a ratio similar to the box (421/502 ~= 0.84)
+    target_ratio = 422 / 502
+    
+    # More generous vertical framing for welcome card
+    crop_top = max(0, int(y - 0.8 * h)) # More headroom
+    crop_bottom = min(height, int(y + h + 1.5 * h)) # Down to chest/mid-torso
+    crop_h = crop_bottom - crop_top
+    
+    crop_w = int(crop_h * target_ratio)
+    
+    crop_left = max(0, face_center_x - crop_w // 2)
+    crop_right = min(width, crop_left + crop_w)
+    
+    if crop_right - crop_left < crop_w:
+         crop_left = max(0, crop_right - crop_w)
+    return crop_left, crop_top, crop_right, crop_bottom
 
-        # Convert to grayscale for detection
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        face_cascade = get_face_cascade()
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-        
-        if len(faces) == 0:
-            return image_bytes # No face found, return original
-            
-        # Pick the largest face (x, y, w, h)
-        faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)
-        x, y, w, h = faces[0]
-        
-        settings = load_settings().get("auto_crop", {}).get("id_card", {})
-        
-        # Widened Ratio to preserve shoulders (more horizontal space)
-        target_ratio = settings.get("target_ratio", 1.2)
-        
-        # Determine crop height - slightly higher headroom
-        crop_top = max(0, int(y - settings.get("top_headroom", 0.7) * h))
-        crop_bottom = min(img.shape[0], int(y + h + settings.get("bottom_extension", 1.2) * h))
-        crop_h = crop_bottom - crop_top
-        
-        # Determine crop width based on ratio
-        crop_w = int(crop_h * target_ratio)
-        
-        # Centering width around face center
-        face_center_x = x + w // 2
-        crop_left = max(0, face_center_x - crop_w // 2)
-        crop_right = min(img.shape[1], crop_left + crop_w)
-        
-        # Adjust if we hit edges
-        if crop_right - crop_left < crop_w:
-            crop_left = max(0, crop_right - crop_w)
-            
-        # Crop
-        cropped_img = img[crop_top:crop_bottom, crop_left:crop_right]
-        
-        # Convert back to bytes
-        is_success, buffer = cv2.imencode(".png", cropped_img)
-        result = buffer.tobytes()
-        _IMAGE_CACHE[img_hash] = result
-        return result
-        
+@span("auto_crop_face")
+def auto_crop_face_photo(photo, box=None):
+    """
+    Smartly crops the image to a Head-to-Chest composition for ID Cards.
+    Target Ratio: ~0.97 (95x98)
+    """
+    try:
+        return _crop_photo(photo, "crop_id_", _id_card_box, box)
     except Exception as e:
         print(f"Auto-crop failed: {e}")
-        return image_bytes
+        return photo
 
-def smart_crop_welcome(image_bytes):
+def detect_id_crop_box(image_bytes):
+    """ID card crop box straight from the upload bytes, or None if detection failed."""
+    try:
+        return find_crop_box(image_bytes, "crop_id_", _id_card_box)
+    except Exception as e:
+        print(f"Crop detection failed: {e}")
+        return None
+
+@span("smart_crop_welcome")
+def smart_crop_welcome_photo(photo):
     """
     Smartly crops the image for Welcome Aboard (Head focused, Center Face).
     Target: Square-ish or slightly rectangular to fit the rounded box.
     """
-    # Normalize first
-    image_bytes = normalize_image(image_bytes)
-    
-    img_hash = get_image_hash(image_bytes, "crop_welcome_")
-    if img_hash in _IMAGE_CACHE:
-        print(f"Cache hit for Welcome crop")
-        return _IMAGE_CACHE[img_hash]
-        
     try:
-        # Optimize: Resize first
-        image_bytes = resize_image_bytes(image_bytes, max_width=1024)
-        
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            return image_bytes
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        face_cascade = get_face_cascade()
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-        
-        if len(faces) == 0:
-            return image_bytes
-
-        # Largest face
-        faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)
-        x, y, w, h = faces[0]
-        
-        face_center_x = x + w // 2
-        
-        # For Welcome Aboard, we want a nice portrait crop.
-        # Let's aim for a ratio similar to the box (421/502 ~= 0.84)
-        target_ratio = 422 / 502
-        
-        # More generous vertical framing for welcome card
-        crop_top = max(0, int(y - 0.8 * h)) # More headroom
-        crop_bottom = min(img.shape[0], int(y + h + 1.5 * h)) # Down to chest/mid-torso
-        crop_h = crop_bottom - crop_top
-        
-        crop_w = int(crop_h * target_ratio)
-        
-        crop_left = max(0, face_center_x - crop_w // 2)
-        crop_right = min(img.shape[1], crop_left + crop_w)
-        
-        if crop_right - crop_left < crop_w:
-             crop_left = max(0, crop_right - crop_w)
-             
-        cropped_img = img[crop_top:crop_bottom, crop_left:crop_right]
-        
-        is_success, buffer = cv2.imencode(".png", cropped_img)
-        result = buffer.tobytes()
-        _IMAGE_CACHE[img_hash] = result
-        return result
-
+        return _crop_photo(photo, "crop_welcome_", _welcome_box)
     except Exception as e:
         print(f"Welcome Smart Crop failed: {e}")
+        return photo
+
+def auto_crop_face(image_bytes):
+    """Bytes-in/bytes-out wrapper around auto_crop_face_photo."""
+    photo = decode_image(image_bytes)
+    if photo is None:
         return image_bytes
+    return auto_crop_face_photo(photo).to_png()
+
+def smart_crop_welcome(image_bytes):
+    """Bytes-in/bytes-out wrapper around smart_crop_welcome_photo."""
+    photo = decode_image(image_bytes)
+    if photo is None:
+        return image_bytes
+    return smart_crop_welcome_photo(photo).to_png()
+
+def crop_id_photo(image_bytes, use_auto_crop=True, box=None):
+    """
+    First half of the ID card pipeline: one decode, then the optional crop.
+    Pass a box from detect_id_crop_box to skip detection on the full image.
+    """
+    photo = decode_image(image_bytes)
+    if photo is None or not use_auto_crop:
+        return photo
+    return auto_crop_face_photo(photo, box)
+
+def matte_id_photo(photo, use_ai_removal=True, model=None):
+    """Second half: optional matte. Falls back to the un-matted photo on failure."""
+    if photo is None or not use_ai_removal:
+        return photo
+    return remove_background_photo(photo, model) or photo
+
+def process_id_photo(image_bytes, use_auto_crop=True, use_ai_removal=True, model=None):
+    """
+    ID card photo pipeline: one decode, then crop -> matte on the Photo.
+    Falls back to the un-matted photo if background removal fails.
+    """
+    return matte_id_photo(crop_id_photo(image_bytes, use_auto_crop), use_ai_removal, model)
@@ -0,0 +1,200 @@
+import fitz
+from utils.template_cache import open_template
+from utils.metrics import span
+
+MM = 72 / 25.4
+
+# Portrait sheet sizes in mm
+SHEET_SIZES = {
+    "A4": (210, 297),
+    "A3": (297, 420),
+    "SRA3": (320, 450),
+}
+
+_MARK_LENGTH = 5 * MM
+_MARK_OFFSET = 2 * MM # Gap between the bleed edge and the start of a crop mark
+_MARK_WIDTH = 0.25
+
+
+class Imposer:
+    """
+    Lays out cards of one layout plan N-up on print sheets.
+
+    Each card's variable layer (text, photo, QR) is drawn once onto a blank
+    overlay page as it is added. Sheets then place the template page with
+    show_pdf_page, which PyMuPDF embeds as a single XObject per output
+    document, and the card's overlay on top of it. File size therefore grows
+    with the variable content only.
+
+    Backs are imposed on a separate sheet, mirrored for duplex printing:
+    flip="long" mirrors across the sheet's long edge (columns on a portrait
+    sheet, rows on a landscape one), flip="short" rotates the whole back sheet.
+    """
+
+    def __init__(self, plan, sheet="A4", landscape=None, cols=None, rows=None, bleed_mm=3.0,
+                 gap_mm=None, margin_mm=10.0, crop_marks=True, duplex=True, flip="long"):
+        if sheet not in SHEET_SIZES:
+            raise ValueError(f"Unknown sheet: {sheet}. Available: {', '.join(SHEET_SIZES)}")
+        if flip not in ("long", "short"):
+            raise ValueError("flip must be 'long' or 'short'")
+        self.plan = plan
+        self.bleed = max(0.0, float(bleed_mm)) * MM
+        self.gap = max(0.0, float(gap_mm)) * MM if gap_mm is not None else 2 * self.bleed
+        self.margin = max(0.0, float(margin_mm)) * MM
+        self.crop_marks = crop_marks
+        self.flip = flip
+
+        template = open_template(plan.template, fallback=plan.fallback)
+        front = min(plan.pages) if plan.pages else 0
+        self.sides = [front] + ([p for p in range(len(template)) if p != front] if duplex else [])
+        self.card_w, self.card_h = template[front].rect.width, template[front].rect.height
+        self.template, self._bleed_edges = self._with_bleed(template)
+        self.overlays = fitz.open()
+        self._cards = [] # (order, {side: overlay page no})
+        self._added = 0
+
+        self.sheet_w, self.sheet_h, self.cols, self.rows = self._grid(sheet, landscape, cols, rows)
+
+    def _with_bleed(self, template):
+        """
+        Widens each template page's cropbox by the bleed, as far as the mediabox
+        has artwork. Returns the doc and per-page (left, top, right, bottom) extra.
+        """
+        edges = {}
+        for page in template:
+            cb, mb = page.cropbox, page.mediabox
+            box = fitz.Rect(cb.x0 - self.bleed, cb.y0 - self.bleed, cb.x1 + self.bleed, cb.y1 + self.bleed) & mb
+            if box != cb:
+                page.set_cropbox(box)
+            edges[page.number] = (cb.x0 - box.x0, cb.y0 - box.y0, box.x1 - cb.x1, box.y1 - cb.y1)
+        return template, edges
+
+    def _fit(self, sheet_w, sheet_h):
+        pitch_w, pitch_h = self.card_w + self.gap, self.card_h + self.gap
+        cols = int((sheet_w - 2 * self.margin + self.gap) // pitch_w)
+        rows = int((sheet_h - 2 * self.margin + self.gap) // pitch_h)
+        return max(cols, 0), max(rows, 0)
+
+    def _grid(self, sheet, landscape, cols, rows):
+        w, h = (v * MM for v in SHEET_SIZES[sheet])
+        if landscape is None:
+            # Pick the orientation that fits more cards
+            portrait, turned = self._fit(w, h), self._fit(h, w)
+            landscape = turned[0] * turned[1] > portrait[0] * portrait[1]
+        if landscape:
+            w, h = h, w
+        fit_cols, fit_rows = self._fit(w, h)
+        cols = min(int(cols), fit_cols) if cols else fit_cols
+        rows = min(int(rows), fit_rows) if rows else fit_rows
+        if cols < 1 or rows < 1:
+            raise ValueError(f"A {self.card_w / MM:.0f}x{self.card_h / MM:.0f}mm card does not fit on {sheet}")
+        return w, h, cols, rows
+
+    @property
+    def per_sheet(self):
+        return self.cols * self.rows
+
+    def __len__(self):
+        return len(self._cards)
+
+    def add(self, fields, images=None, order=None):
+        """Draws one card's variable layer. `order` sorts cards on the sheets (default: insertion)."""
+        pages = {}
+        for side in self.sides:
+            if side in self.plan.pages:
+                page = self.overlays.new_page(width=self.card_w, height=self.card_h)
+                self.plan.render_page(page, side, fields, images)
+                pages[side] = page.number
+        self._cards.append((self._added if order is None else order, pages))
+        self._added += 1
+
+    def _cell(self, index, back):
+        row, col = divmod(index, self.cols)
+        if back and self.flip == "long":
+            if self.sheet_w > self.sheet_h:
+                row = self.rows - 1 - row
+            else:
+                col = self.cols - 1 - col
+        elif back:
+            row, col = self.rows - 1 - row, self.cols - 1 - col
+        grid_w = self.cols * self.card_w + (self.cols - 1) * self.gap
+        grid_h = self.rows * self.card_h + (self.rows - 1) * self.gap
+        x = (self.sheet_w - grid_w) / 2 + col * (self.card_w + self.gap)
+        y = (self.sheet_h - grid_h) / 2 + row * (self.card_h + self.gap)
+        return fitz.Rect(x, y, x + self.card_w, y + self.card_h)
+
+    def _draw_crop_marks(self, page):
+        first, last = self._cell(0, False), self._cell(self.per_sheet - 1, False)
+        start = self.bleed + _MARK_OFFSET
+        shape = page.new_shape()
+        for col in range(self.cols):
+            cell = self._cell(col, False)
+            for x in (cell.x0, cell.x1):
+                shape.draw_line((x, first.y0 - start - _MARK_LENGTH), (x, first.y0 - start))
+                shape.draw_line((x, last.y1 + start), (x, last.y1 + start + _MARK_LENGTH))
+        for row in range(self.rows):
+            cell = self._cell(row * self.cols, False)
+            for y in (cell.y0, cell.y1):
+                shape.draw_line((first.x0 - start - _MARK_LENGTH, y), (first.x0 - start, y))
+                shape.draw_line((last.x1 + start, y), (last.x1 + start + _MARK_LENGTH, y))
+        shape.finish(color=(0, 0, 0), width=_MARK_WIDTH)
+        shape.commit()
+
+    def _impose(self, doc, cards):
+        """Appends the sheets for `cards` ({side: overlay page no} each) to doc."""
+        for start in range(0, len(cards), self.per_sheet):
+            chunk = cards[start:start + self.per_sheet]
+            for side_index, side in enumerate(self.sides):
+                back = side_index > 0
+                rotate = 180 if back and self.flip == "short" else 0
+                left, top, right, bottom = self._bleed_edges[side]
+                if rotate:
+                    left, top, right, bottom = right, bottom, left, top
+                sheet = doc.new_page(width=self.sheet_w, height=self.sheet_h)
+                for index, pages in enumerate(chunk):
+                    trim = self._cell(index, back)
+                    art = fitz.Rect(trim.x0 - left, trim.y0 - top, trim.x1 + right, trim.y1 + bottom)
+                    sheet.show_pdf_page(art, self.template, side, rotate=rotate)
+                    if side in pages:
+                        sheet.show_pdf_page(trim, self.overlays, pages[side], rotate=rotate)
+                if self.crop_marks:
+                    self._draw_crop_marks(sheet)
+
+    def _ordered(self):
+        return sorted(self._cards, key=lambda c: c[0])
+
+    @span("impose")
+    def build(self):
+        """Returns the imposed document: per sheet, the fronts then each back side."""
+        doc = fitz.open()
+        self._impose(doc, [pages for _, pages in self._ordered()])
+        return doc
+
+    @span("impose")
+    def impose_into(self, doc, final=False):
+        """
+        Streaming alternative to build(): appends the sheets that are full so
+        far (every remaining card when final) to doc and drops their overlays,
+        so only the cards of the current sheet stay in memory. Returns the
+        number of cards imposed.
+        """
+        cards = self._ordered()
+        count = len(cards) if final else len(cards) // self.per_sheet * self.per_sheet
+        if not count:
+            return 0
+        self._impose(doc, [pages for _, pages in cards[:count]])
+        # Carry the overlays of a partly filled sheet over to a fresh document
+        overlays = fitz.open()
+        self._cards = []
+        for order, pages in cards[count:]:
+            moved = {}
+            for side, page_no in pages.items():
+                overlays.insert_pdf(self.overlays, from_page=page_no, to_page=page_no)
+                moved[side] = len(overlays) - 1
+            self._cards.append((order, moved))
+        self.overlays.close()
+        self.overlays = overlays
+        return count
+
+    def write(self):
+        return self.build().tobytes(garbage=3, deflate=True)
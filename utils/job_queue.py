@@ -0,0 +1,379 @@
+import os
+import time
+import uuid
+import queue
+import signal
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from utils.settings_manager import get_setting
+
+# Heavy generation runs in worker processes so matting and rendering don't
+# share the API process's GIL with request parsing, health and preview calls.
+_RESULT_TTL_SECONDS = 600 # Finished jobs are kept this long for /result
+_TIMEOUT_GRACE_SECONDS = 5 # Extra wait before the parent gives up on a worker
+
+
+class JobTimeout(BaseException):
+    """BaseException so the generators' broad `except Exception` blocks can't swallow it."""
+
+
+class JobCancelled(BaseException):
+    """Raised inside a worker when the parent cancels the job it is running."""
+
+
+# --- Worker process side --------------------------------------------------
+
+_STARTED = None # multiprocessing.Queue: worker -> parent "job started" notices
+_CANCEL = None # multiprocessing.Array: per-worker slot holding the job id the parent wants stopped
+_SLOT = None # This worker's slot in _CANCEL
+_CURRENT = None # Id of the job this worker is running
+_ID_SIZE = 32 # len(uuid4().hex)
+
+
+def _init_worker(pool_threads, started, cancel, slots):
+    """Runs once per worker process: one rembg session per process, warmed up front."""
+    global _STARTED, _CANCEL, _SLOT
+    _STARTED, _CANCEL = started, cancel
+    with slots.get_lock():
+        slot, slots.value = slots.value, slots.value + 1
+    _SLOT = slot if slot < len(cancel) // _ID_SIZE else None
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, _on_cancel)
+    # Assigned, not defaulted: the env vars beat settings, and an inherited
+    # REMBG_POOL_SIZE sized for the API process would oversubscribe the cores
+    os.environ["REMBG_POOL_SIZE"] = "1"
+    os.environ["REMBG_INTRA_OP_THREADS"] = str(pool_threads)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Shutdown is driven by the parent
+    from utils.image_processing import warm_up
+    try:
+        warm_up()
+    except Exception as e:
+        print(f"Job worker warm-up failed: {e}")
+
+
+def _on_alarm(signum, frame):
+    raise JobTimeout("Job exceeded its time limit")
+
+
+def _on_cancel(signum, frame):
+    # The parent names the job in this worker's slot, so a signal that lands
+    # after the job finished (and another started) is ignored
+    if _CURRENT and _SLOT is not None:
+        start = _SLOT * _ID_SIZE
+        if _CANCEL[start:start + _ID_SIZE] == _CURRENT.encode():
+            raise JobCancelled("Job cancelled")
+
+
+def _run(job_id, kind, params, file_bytes, timeout):
+    """Worker entry point: runs one job with a SIGALRM deadline."""
+    global _CURRENT
+    _CURRENT = job_id
+    try:
+        if _STARTED is not None and job_id:
+            _STARTED.put((job_id, time.time(), os.getpid(), _SLOT))
+        if timeout and hasattr(signal, "setitimer"):
+            signal.signal(signal.SIGALRM, _on_alarm)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        return JOB_KINDS[kind][0](params, file_bytes)
+    finally:
+        _CURRENT = None
+        if timeout and hasattr(signal, "setitimer"):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _flag(params, name, default=True):
+    value = params.get(name, default)
+    return value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes", "on")
+
+
+def _id_card_photo(params, file_bytes):
+    from utils.image_processing import process_id_photo, resolve_matting_model
+    model = resolve_matting_model(params.get("model"), params.get("quality", "high"))
+    return process_id_photo(file_bytes, _flag(params, "use_auto_crop"), _flag(params, "use_ai_removal"), model)
+
+
+def _id_card_args(params, photo):
+    return (params["first_name"], params.get("last_name", ""), params.get("title", ""), params["id_number"],
+            params.get("doj", ""), photo, params.get("emergency_no", ""), params.get("blood_group", ""),
+            params.get("office_address", ""), float(params.get("scale", 1.0)),
+            int(params.get("x_offset", 0)), int(params.get("y_offset", 0)))
+
+
+def _job_id_card_pdf(params, file_bytes):
+    from utils.pdf_generator import generate_id_card_pdf
+    return generate_id_card_pdf(*_id_card_args(params, _id_card_photo(params, file_bytes)))
+
+
+def _job_id_card_preview(params, file_bytes):
+    from utils.pdf_generator import generate_id_card_preview
+    params = dict(params, quality=params.get("quality", "fast"))
+    return generate_id_card_preview(*_id_card_args(params, _id_card_photo(params, file_bytes)))
+
+
+def _job_welcome_image(params, file_bytes):
+    import datetime
+    from utils.image_processing import decode_image, smart_crop_welcome_photo
+    from utils.welcome_generator import generate_welcome_image
+    photo = decode_image(file_bytes)
+    if photo is None:
+        raise ValueError("Unsupported image")
+    if _flag(params, "use_auto_crop"):
+        photo = smart_crop_welcome_photo(photo)
+    doj = datetime.datetime.strptime(params["doj"], "%Y-%m-%d")
+    return generate_welcome_image(params["first_name"], params.get("last_name", ""), params.get("title", ""), doj, photo)
+
+
+def _job_business_card_pdf(params, file_bytes):
+    from utils.business_card_generator import generate_business_card_pdf
+    data = {k: v for k, v in params.items() if k != "template"}
+    return generate_business_card_pdf(params.get("template", "Metaweb"), data)
+
+
+def _job_remove_bg(params, file_bytes):
+    from utils.image_processing import remove_background, resolve_matting_model
+    return remove_background(file_bytes, resolve_matting_model(params.get("model"), params.get("quality", "high")))
+
+
+# Key: job kind, Value: (worker function, media type of the result)
+JOB_KINDS = {
+    "noop": (lambda params, file_bytes: b"", "application/octet-stream"),
+    "id_card_pdf": (_job_id_card_pdf, "application/pdf"),
+    "id_card_preview": (_job_id_card_preview, "image/png"),
+    "welcome_image": (_job_welcome_image, "image/jpeg"),
+    "business_card_pdf": (_job_business_card_pdf, "application/pdf"),
+    "remove_bg": (_job_remove_bg, "image/png"),
+}
+
+
+# --- API process side -----------------------------------------------------
+
+class Job:
+    __slots__ = ("id", "kind", "status", "error", "result", "created", "started", "finished", "timeout", "future", "worker")
+
+    def __init__(self, kind, timeout):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"  # queued -> running -> done | failed | timeout | cancelled
+        self.error = None
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.timeout = timeout
+        self.future = None
+        self.worker = None  # (pid, cancel slot) once a worker picks the job up
+
+    @property
+    def media_type(self):
+        return JOB_KINDS[self.kind][1]
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "queued_seconds": round((self.started or self.finished or time.time()) - self.created, 3),
+            "run_seconds": round((self.finished or time.time()) - self.started, 3) if self.started else None,
+        }
+
+
+def _job_config():
+    """Worker count and default per-job timeout (JOB_WORKERS / JOB_TIMEOUT_SECONDS or settings)."""
+    workers = int(os.environ.get("JOB_WORKERS") or get_setting("performance", "job_workers") or 1)
+    timeout = float(os.environ.get("JOB_TIMEOUT_SECONDS") or get_setting("performance", "job_timeout_seconds") or 120)
+    return max(1, workers), timeout
+
+
+class JobQueue:
+    """
+    Submit/status/result/cancel on top of a ProcessPoolExecutor.
+    Workers are spawned (not forked, the API process runs threads) and warm
+    their rembg session before taking work. Timeouts are enforced inside the
+    worker with SIGALRM; a watchdog marks jobs that overrun even that.
+    Cancelling a queued job removes it; for a running job the worker gets
+    SIGUSR1 and raises JobCancelled at its next Python instruction (a model
+    call in native code finishes first), freeing the process for other work.
+    """
+
+    def __init__(self, workers, default_timeout):
+        self.workers = workers
+        self.default_timeout = default_timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = {} # Key: job id, Value: Job
+        self._early = {} # Key: job id, Value: (started, pid, slot) of a notice that arrived before its job was known
+        self._started = None
+        self._cancel = None
+        self._watchdog = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                context = multiprocessing.get_context("spawn")
+                self._started = context.Queue()
+                self._cancel = context.Array("c", self.workers * _ID_SIZE)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                    initargs=(threads, self._started, self._cancel, context.Value("i", 0)),
+                )
+                self._watchdog = threading.Thread(target=self._watch, args=(self._started,), name="job-watchdog", daemon=True)
+                self._watchdog.start()
+            return self._executor
+
+    def prewarm(self):
+        """Starts every worker now (spawn + model warm-up) instead of on the first job."""
+        pool = self._pool()
+        for future in [pool.submit(_run, None, "noop", {}, None, 0) for _ in range(self.workers)]:
+            future.result()
+
+    def submit(self, kind, params=None, file_bytes=None, timeout=None):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}. Available: {', '.join(JOB_KINDS)}")
+        self._purge()
+        job = Job(kind, float(timeout or self.default_timeout))
+        args = (_run, job.id, kind, dict(params or {}), file_bytes, job.timeout)
+        # Registered before submitting: the worker's "started" notice can beat submit() returning
+        with self._lock:
+            self._jobs[job.id] = job
+            early = self._early.pop(job.id, None)
+            if early is not None:
+                job.status, job.started, job.worker = "running", early[0], early[1:]
+        try:
+            try:
+                job.future = self._pool().submit(*args)
+            except BrokenProcessPool:
+                # A worker died (OOM, segfault): start a fresh pool instead of failing forever
+                print("Job worker pool broken, restarting it")
+                self.shutdown()
+                job.future = self._pool().submit(*args)
+        except BaseException:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise
+        job.future.add_done_callback(lambda f, job=job: self._finish(job, f))
+        return job
+
+    def _finish(self, job, future):
+        with self._lock:
+            if job.status in ("cancelled", "timeout"):
+                return  # Decided already; drop whatever the worker produced
+            job.finished = time.time()
+            job.started = job.started or job.finished
+            try:
+                job.result = future.result()
+                if job.result is None:
+                    job.status, job.error = "failed", "Generation failed"
+                else:
+                    job.status = "done"
+            except CancelledError:
+                job.status = "cancelled"
+            except JobTimeout as e:
+                job.status, job.error = "timeout", str(e)
+            except JobCancelled:
+                job.status = "cancelled"
+            except Exception as e:
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+
+    def _watch(self, started):
+        """Runs per pool; exits when shutdown() closes that pool's notice queue."""
+        while True:
+            try:
+                job_id, at, pid, slot = started.get(timeout=0.25)
+            except queue.Empty:
+                job_id = None
+            except (EOFError, OSError, ValueError):
+                return  # Queue closed on shutdown
+            now = time.time()
+            with self._lock:
+                job = self._jobs.get(job_id) if job_id else None
+                if job is not None and job.status == "queued":
+                    job.status, job.started, job.worker = "running", at, (pid, slot)
+                elif job is not None and job.status == "cancelled" and job.worker is None:
+                    # Cancelled after it was handed to the pool but before it started
+                    job.worker = (pid, slot)
+                    self._signal_cancel(job)
+                elif job is None and job_id:
+                    self._early[job_id] = (at, pid, slot)
+                for job in self._jobs.values():
+                    if job.status == "running" and now - job.started > job.timeout + _TIMEOUT_GRACE_SECONDS:
+                        job.status, job.finished = "timeout", now
+                        job.error = "Job exceeded its time limit"
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            if job.status not in ("queued", "running"):
+                return job
+            job.status, job.finished = "cancelled", time.time()
+        # Outside the lock: a successful cancel() runs _finish right here.
+        # It only succeeds while the job is still queued; a job already handed
+        # to a worker is signalled now, or by the watchdog once it starts.
+        if not job.future.cancel():
+            with self._lock:
+                if job.worker is not None:
+                    self._signal_cancel(job)
+        return job
+
+    def _signal_cancel(self, job):
+        """Asks the worker running `job` to stop. Call with the lock held."""
+        pid, slot = job.worker
+        if slot is None or self._cancel is None:
+            return
+        start = slot * _ID_SIZE
+        self._cancel[start:start + _ID_SIZE] = job.id.encode()
+        try:
+            os.kill(pid, signal.SIGUSR1)
+        except (OSError, AttributeError) as e:
+            print(f"Could not signal job worker {pid}: {e}")
+
+    def _purge(self):
+        now = time.time()
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and now - j.finished > _RESULT_TTL_SECONDS]:
+                del self._jobs[job_id]
+            for job_id in [i for i, notice in self._early.items() if now - notice[0] > _RESULT_TTL_SECONDS]:
+                del self._early[job_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"workers": self.workers, "started": self._executor is not None, "jobs": counts}
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            started, self._started = self._started, None
+            watchdog, self._watchdog = self._watchdog, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if started is not None:
+            # Stops this pool's watchdog; a restarted pool gets its own queue and thread
+            started.close()
+            started.cancel_join_thread()
+        if watchdog is not None and watchdog is not threading.current_thread():
+            watchdog.join(timeout=1)
+
+
+_QUEUE = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_job_queue():
+    global _QUEUE
+    if _QUEUE is None:
+        with _QUEUE_LOCK:
+            if _QUEUE is None:
+                _QUEUE = JobQueue(*_job_config())
+    return _QUEUE
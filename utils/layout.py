@@ -0,0 +1,294 @@
+import os
+import threading
+import fitz
+from PIL import Image
+import io
+from utils.settings_manager import load_settings_versioned, settings_to_dict
+from utils.fonts import register_fonts, text_length
+from utils.photo import Photo, make_rounded
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BLUE_TEXT = (18/255, 34/255, 66/255)
+WHITE_TEXT = (1, 1, 1)
+BLACK_TEXT = (0, 0, 0)
+
+# Business card layouts as data: adding a style only needs a new entry here or
+# under business_card.layouts in settings.json. Text uses {field} placeholders.
+BUSINESS_CARD_LAYOUTS = {
+    "Trikon": {
+        "template": "Name_Trikon.pdf",
+        "page": 1,
+        "ops": [
+            {"type": "text", "pos": [21.15, 26], "text": "{first_name}", "upper": True, "font": "pop-bold", "size": 11},
+            {"type": "text", "pos": [21.15, 26], "text": "{last_name}", "upper": True, "font": "pop-light", "size": 11,
+             "after": {"text": "{first_name} ", "upper": True, "font": "pop-bold", "size": 11}},
+            {"type": "text", "pos": [21.15, 36], "text": "{title}", "font": "pop-reg", "size": 6},
+            {"type": "text", "pos": [34, 56], "text": "{address_line1}", "font": "pop-med", "size": 6},
+            {"type": "text", "pos": [34, 64], "text": "{address_line2}", "font": "pop-med", "size": 6},
+            {"type": "text", "pos": [34, 75], "text": "{phone_mobile}", "font": "pop-med", "size": 6},
+            {"type": "text", "pos": [34, 86], "text": "{email}", "font": "pop-med", "size": 6},
+            {"type": "text", "pos": [34, 97], "text": "{phone_office}", "font": "pop-med", "size": 6},
+            {"type": "text", "pos": [34, 108], "text": "{website}", "font": "pop-med", "size": 6},
+            {"type": "image", "source": "qr", "rect": [160.62, 39.29, 242.94, 121.61]},
+        ],
+    },
+    # The old generator never managed to embed Montserrat and fell back to
+    # Helvetica with a fixed 7pt-per-character last-name offset; kept as-is.
+    # Montserrat ("mont-*" with a measured "after") can be set under
+    # business_card.layouts.
+    "Metaweb": {
+        "template": "Name_MetaWeb.pdf",
+        "page": 1,
+        "ops": [
+            {"type": "text", "pos": [18, 38], "text": "{first_name}", "font": "helv", "size": 12},
+            {"type": "text", "pos": [18, 38], "text": "{last_name}", "font": "helv", "size": 12,
+             "after": {"text": "{first_name}", "advance": 7}},
+            {"type": "text", "pos": [19, 50], "text": "{title}", "font": "helv", "size": 6},
+            {"type": "text", "pos": [30, 74], "text": "{phone_mobile}", "font": "helv", "size": 5},
+            {"type": "text", "pos": [30, 88], "text": "{phone_office}", "font": "helv", "size": 5},
+            {"type": "text", "pos": [30, 103], "text": "{email}", "font": "helv", "size": 5},
+            {"type": "text", "pos": [30, 116], "text": "{website}", "font": "helv", "size": 5},
+            {"type": "text", "pos": [30, 129], "text": "{address_line1}", "font": "helv", "size": 5},
+            {"type": "text", "pos": [30, 137], "text": "{address_line2}", "font": "helv", "size": 5},
+            {"type": "image", "source": "qr", "rect": [179.18, 74.31, 246.18, 141.31]},
+        ],
+    },
+}
+
+
+def _format(template, fields, upper=False):
+    text = template.format_map(fields)
+    return text.upper() if upper else text
+
+
+class TextOp:
+    """insert_text at a fixed point, optionally shifted right by the width of other text."""
+    __slots__ = ("pos", "text", "font", "size", "color", "upper", "after")
+
+    def __init__(self, pos, text, font, size, color=BLACK_TEXT, upper=False, after=None):
+        self.pos = tuple(pos)
+        self.text = text
+        self.font = font
+        self.size = size
+        self.color = tuple(color)
+        self.upper = upper
+        self.after = after  # (text, upper, font, size, advance) whose width offsets x
+
+    def draw(self, page, ctx):
+        x, y = self.pos
+        if self.after:
+            text, upper, font, size, advance = self.after
+            text = _format(text, ctx.fields, upper)
+            # a fixed per-character advance instead of measuring the font
+            x += len(text) * advance if advance else text_length(text, ctx.font(font), size)
+        page.insert_text((x, y), _format(self.text, ctx.fields, self.upper),
+                         fontsize=self.size, fontname=ctx.font(self.font), color=self.color)
+
+
+class TextBoxOp:
+    """insert_textbox; None in the rect means the page edge."""
+    __slots__ = ("rect", "text", "font", "size", "color", "align")
+
+    def __init__(self, rect, text, font, size, color=BLACK_TEXT, align=0):
+        self.rect = tuple(rect)
+        self.text = text
+        self.font = font
+        self.size = size
+        self.color = tuple(color)
+        self.align = align
+
+    def draw(self, page, ctx):
+        edges = (0, 0, page.rect.width, page.rect.height)
+        rect = fitz.Rect([v if v is not None else e for v, e in zip(self.rect, edges)]) & page.rect
+        if rect.is_empty:
+            # e.g. a template shorter than the box's top edge: skip the box, keep the card
+            print(f"Text box {tuple(self.rect)} is outside the {page.rect.width:.0f}x{page.rect.height:.0f} page, skipped")
+            return
+        page.insert_textbox(rect, _format(self.text, ctx.fields), fontsize=self.size,
+                            fontname=ctx.font(self.font), color=self.color, align=self.align)
+
+
+class ImageOp:
+    """
+    Places a bound image (photo, qr, ...). `adjustable` applies the request's
+    scale/offset around the rect centre; `radius` rounds the corners.
+    """
+    __slots__ = ("source", "rect", "radius", "adjustable")
+
+    def __init__(self, source, rect, radius=None, adjustable=False):
+        self.source = source
+        self.rect = tuple(rect)
+        self.radius = radius
+        self.adjustable = adjustable
+
+    def placement(self, ctx):
+        x0, y0, x1, y1 = self.rect
+        if not self.adjustable:
+            return fitz.Rect(x0, y0, x1, y1)
+        w, h = x1 - x0, y1 - y0
+        base_w, base_h = w * ctx.scale, h * ctx.scale
+        adj_x = x0 + ctx.x_offset - (base_w - w) / 2
+        adj_y = y0 + ctx.y_offset - (base_h - h) / 2
+        return fitz.Rect(adj_x, adj_y, adj_x + base_w, adj_y + base_h)
+
+    def draw(self, page, ctx):
+        image = ctx.images.get(self.source)
+        if image is None:
+            return
+        rect = self.placement(ctx)
+        if self.radius is not None:
+            if isinstance(image, Photo):
+                image = image.image
+            elif not isinstance(image, Image.Image):
+                image = Image.open(io.BytesIO(image))
+            image = make_rounded(image, rect.width, rect.height, self.radius)
+        if isinstance(image, Image.Image):
+            image = Photo(image, None)
+        if isinstance(image, Photo):
+            page.insert_image(rect, pixmap=image.to_pixmap())
+        else:
+            page.insert_image(rect, stream=image)
+
+
+class _Context:
+    """Per-request bindings for a plan run."""
+    __slots__ = ("fields", "images", "scale", "x_offset", "y_offset", "loaded")
+
+    def __init__(self, fields, images, scale, x_offset, y_offset):
+        self.fields = fields
+        self.images = images
+        self.scale = scale
+        self.x_offset = x_offset
+        self.y_offset = y_offset
+        self.loaded = set()
+
+    def font(self, alias, fallback="helv"):
+        return alias if alias in self.loaded else fallback
+
+
+class LayoutPlan:
+    """
+    Draw operations and static geometry for one template, compiled once from
+    settings. A request only binds fields/images and runs the ops.
+    """
+
+    def __init__(self, template, fallback, pages):
+        self.template = template
+        self.fallback = fallback
+        self.pages = pages  # {page_no: [ops]}
+        self.fonts = {
+            page_no: sorted({op.font for op in ops if hasattr(op, "font")} |
+                            {op.after[2] for op in ops if getattr(op, "after", None) and op.after[2]})
+            for page_no, ops in pages.items()
+        }
+
+    def render(self, doc, fields, images=None, scale=1.0, x_offset=0, y_offset=0, pages=None):
+        """Draws the plan onto doc (the template or a blank overlay of the same size)."""
+        ctx = _Context(fields, images or {}, scale, x_offset, y_offset)
+        for page_no in self.pages:
+            if page_no >= len(doc) or (pages is not None and page_no not in pages):
+                continue
+            self._draw_page(doc[page_no], page_no, ctx)
+        return doc
+
+    def render_page(self, page, page_no, fields, images=None, scale=1.0, x_offset=0, y_offset=0):
+        """Draws one plan page onto an arbitrary page, e.g. a transparent overlay."""
+        ctx = _Context(fields, images or {}, scale, x_offset, y_offset)
+        self._draw_page(page, page_no, ctx)
+        return page
+
+    def _draw_page(self, page, page_no, ctx):
+        ctx.loaded = register_fonts(page, self.fonts[page_no])
+        for op in self.pages[page_no]:
+            op.draw(page, ctx)
+
+
+def _op_from_spec(spec):
+    kind = spec.get("type", "text")
+    color = spec.get("color", BLACK_TEXT)
+    if kind == "text":
+        after = spec.get("after")
+        if after:
+            after = (after["text"], after.get("upper", False), after.get("font"), after.get("size"),
+                     after.get("advance"))
+        return TextOp(spec["pos"], spec["text"], spec["font"], spec["size"], color, spec.get("upper", False), after)
+    if kind == "textbox":
+        return TextBoxOp(spec["rect"], spec["text"], spec["font"], spec["size"], color, spec.get("align", 0))
+    if kind == "image":
+        return ImageOp(spec["source"], spec["rect"], spec.get("radius"), spec.get("adjustable", False))
+    raise ValueError(f"Unknown layout op: {kind}")
+
+
+def _compile_id_card(settings):
+    s = settings.get("id_card", {})
+    photo_x, photo_y = s.get("photo_pos", (11, 35.2))
+    photo_w, photo_h = s.get("photo_size", (95, 98))
+    front = [
+        TextOp(s.get("first_name_pos", (14.8, 148)), "{first_name}", "ru-bold", 15, BLUE_TEXT, upper=True),
+        TextOp(s.get("last_name_pos", (15.0, 163)), "{last_name}", "ru-light", 11, BLUE_TEXT, upper=True),
+        TextOp(s.get("title_pos", (15.5, 183)), "{title}", "ru-reg", 8, BLUE_TEXT),
+        TextOp(s.get("doj_pos", (15.1, 196)), "D.O.J:  {doj}", "ru-bold", 8, BLUE_TEXT),
+        TextOp(s.get("id_number_pos", (15.6, 226)), "ID Number: {id_number}", "ru-reg", 10, WHITE_TEXT),
+        ImageOp("photo", (photo_x, photo_y, photo_x + photo_w, photo_y + photo_h), adjustable=True),
+    ]
+    back = [
+        TextOp((20, 93), "Emergency Number: {emergency_no}", "ru-reg", 7, WHITE_TEXT),
+        TextOp((49, 106), "Blood Group: {blood_group}", "ru-reg", 7, WHITE_TEXT),
+        TextBoxOp((0, 174, None, None), "{office_address}", "ru-reg", 6.5, WHITE_TEXT, align=1),
+    ]
+    template = s.get("template_path", "Name_Trikon.pdf")
+    return LayoutPlan(template, os.path.join(_BASE_DIR, "Templates", "Name_Trikon.pdf"), {0: front, 1: back})
+
+
+def _compile_welcome(settings):
+    s = settings.get("welcome_aboard", {})
+    p = s.get("photo_rect", [71, 340, 421.978, 502.045, 28.492])
+    x, y, w, h = p[0], p[1], p[2], p[3]
+    r = p[4] if len(p) > 4 else 28.492
+    ops = [
+        ImageOp("photo", (x, y, x + w, y + h), radius=r),
+        TextOp(s.get("first_name_pos", (563, 500)), "{first_name}", "ru-bold", 77, WHITE_TEXT),
+        TextOp(s.get("last_name_pos", (563, 580)), "{last_name}", "ru-light", 77, WHITE_TEXT),
+        TextOp(s.get("title_pos", (563, 640)), "{title}", "ru-reg", 25, WHITE_TEXT),
+        TextOp(s.get("date_pos", (563, 700)), "{date}", "ru-bold", 26, WHITE_TEXT),
+    ]
+    template = s.get("template_path", "welcome aboard - Without name.pdf")
+    return LayoutPlan(template, os.path.join(_BASE_DIR, "Templates", "welcome aboard - Without name.pdf"), {0: ops})
+
+
+def _compile_business_card(settings, style):
+    layouts = dict(BUSINESS_CARD_LAYOUTS)
+    layouts.update(settings.get("business_card", {}).get("layouts", {}))
+    spec = layouts.get(style) or layouts["Metaweb"]
+    ops = [_op_from_spec(op) for op in spec["ops"]]
+    return LayoutPlan(spec["template"], os.path.join(_BASE_DIR, "Templates", spec["template"]), {spec.get("page", 0): ops})
+
+
+_COMPILERS = {
+    "id_card": _compile_id_card,
+    "welcome": _compile_welcome,
+}
+
+_LOCK = threading.Lock()
+_PLANS = {} # Key: (kind, variant, settings version), Value: LayoutPlan
+
+
+def get_layout_plan(kind, variant=None):
+    """Returns the compiled plan for a template, recompiling when settings change."""
+    snapshot, version = load_settings_versioned()
+    key = (kind, variant, version)
+    plan = _PLANS.get(key)
+    if plan is None:
+        settings = settings_to_dict(snapshot)
+        if kind == "business_card":
+            plan = _compile_business_card(settings, variant)
+        else:
+            plan = _COMPILERS[kind](settings)
+        with _LOCK:
+            # Drop plans compiled from older settings
+            for stale in [k for k in _PLANS if k[2] != key[2]]:
+                del _PLANS[stale]
+            _PLANS[key] = plan
+    return plan
+
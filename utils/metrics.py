@@ -0,0 +1,285 @@
+import time
+import threading
+from contextlib import ContextDecorator
+
+# Process-local metrics in the Prometheus text format. Request latency comes
+# from MetricsMiddleware, stage timings from span(), and cache/pool/queue
+# numbers are read from the existing stats() snapshots at scrape time.
+
+# Seconds: a cached response takes milliseconds, a cold high-quality matte seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {} # Key: tuple of label values
+        _REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _labels(self, key):
+        return dict(zip(self.label_names, key))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(k), v) for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class _Timer(ContextDecorator):
+    """Observes the wall time of a with-block or decorated call."""
+
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+        self._local = threading.local() # Decorated functions may run on many threads at once
+
+    def __enter__(self):
+        self._local.started = getattr(self._local, "started", [])
+        self._local.started.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._local.started.pop(), **self._labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """Context manager / decorator timing its block into this histogram."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    out.append((self.name + "_bucket", dict(labels, le=_format_value(float(bound))), cumulative))
+                out.append((self.name + "_bucket", dict(labels, le="+Inf"), count))
+                out.append((self.name + "_sum", labels, round(total, 6)))
+                out.append((self.name + "_count", labels, count))
+        return out
+
+
+HTTP_LATENCY = Histogram("trikon_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("trikon_http_requests_in_flight", "HTTP requests being handled")
+HTTP_BYTES_IN = Counter("trikon_http_request_bytes_total", "Request body bytes received", ("route",))
+HTTP_BYTES_OUT = Counter("trikon_http_response_bytes_total", "Response body bytes sent", ("route",))
+SPANS = Histogram("trikon_span_seconds", "Time spent in instrumented processing stages", ("span",))
+INFERENCE = Histogram("trikon_onnx_inference_seconds", "rembg/ONNX matting time per call", ("model", "batch"))
+
+
+def span(name):
+    """Times a stage into trikon_span_seconds; use as `with span(...)` or `@span(...)`."""
+    return SPANS.time(span=name)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status, in-flight count and body bytes per route. The
+    route label is the matched path template (/api/jobs/{job_id}), never the
+    raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+        sent = [0]
+        received = [0]
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                received[0] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                sent[0] += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - started, method=scope["method"], route=route, status=status[0])
+            HTTP_BYTES_IN.inc(received[0], route=route)
+            HTTP_BYTES_OUT.inc(sent[0], route=route)
+
+
+# --- Scrape-time collection from existing stats() snapshots -----------------
+
+def _cache_samples(out, cache, stats):
+    out["trikon_cache_bytes"].append(({"cache": cache}, stats["bytes"]))
+    out["trikon_cache_max_bytes"].append(({"cache": cache}, stats["max_bytes"]))
+    if "entries" in stats:
+        out["trikon_cache_entries"].append(({"cache": cache}, stats["entries"]))
+    for namespace, counters in stats["namespaces"].items():
+        labels = {"cache": cache, "namespace": namespace}
+        for name in ("hits", "misses", "evictions"):
+            out[f"trikon_cache_{name}_total"].append((labels, counters.get(name, 0)))
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        out["trikon_cache_hit_ratio"].append((labels, round(counters.get("hits", 0) / lookups, 4) if lookups else 0.0))
+
+
+_RUNTIME = {
+    "trikon_cache_bytes": ("gauge", "Bytes held by a cache"),
+    "trikon_cache_max_bytes": ("gauge", "Byte budget of a cache"),
+    "trikon_cache_entries": ("gauge", "Entries held by an in-memory cache"),
+    "trikon_cache_hits_total": ("counter", "Cache hits by key namespace"),
+    "trikon_cache_misses_total": ("counter", "Cache misses by key namespace"),
+    "trikon_cache_evictions_total": ("counter", "Cache evictions by key namespace"),
+    "trikon_cache_hit_ratio": ("gauge", "hits / (hits + misses) by key namespace"),
+    "trikon_not_modified_total": ("counter", "304 responses answered from ETags"),
+    "trikon_rembg_sessions": ("gauge", "rembg sessions created per model"),
+    "trikon_rembg_sessions_in_use": ("gauge", "rembg sessions checked out"),
+    "trikon_rembg_waiting": ("gauge", "Requests waiting for a rembg session"),
+    "trikon_rembg_wait_seconds_max": ("gauge", "Longest wait for a rembg session"),
+    "trikon_executor_workers": ("gauge", "Threads per offload executor"),
+    "trikon_executor_in_flight": ("gauge", "Calls queued or running per offload executor"),
+    "trikon_executor_calls_total": ("counter", "Calls per offload executor"),
+    "trikon_executor_wait_seconds_avg": ("gauge", "Average queue wait per offload executor"),
+    "trikon_jobs": ("gauge", "Background jobs by status"),
+    "trikon_job_workers": ("gauge", "Job worker processes"),
+    "trikon_event_loop_lag_seconds": ("gauge", "Latest event loop lag sample"),
+    "trikon_event_loop_lag_max_seconds": ("gauge", "Largest event loop lag seen"),
+    "trikon_event_loop_slow_samples_total": ("counter", "Loop lag samples over the slow threshold"),
+}
+
+
+def _runtime_samples():
+    from utils.image_processing import get_image_cache_stats, get_rembg_pool_stats
+    from utils.preview_renderer import get_preview_cache_stats
+    from utils.response_cache import get_response_cache_stats
+    from utils.offload import get_offload_stats, LOOP_LAG
+    from utils.job_queue import get_job_queue
+
+    out = {name: [] for name in _RUNTIME}
+    image = get_image_cache_stats()
+    _cache_samples(out, "image", image)
+    if image.get("disk"):
+        _cache_samples(out, "disk", image["disk"])
+    _cache_samples(out, "preview", get_preview_cache_stats())
+    responses = get_response_cache_stats()
+    _cache_samples(out, "response", responses)
+    for kind, count in responses["not_modified"].items():
+        out["trikon_not_modified_total"].append(({"kind": kind}, count))
+
+    for model, pool in get_rembg_pool_stats().items():
+        out["trikon_rembg_sessions"].append(({"model": model}, pool["created"]))
+        out["trikon_rembg_sessions_in_use"].append(({"model": model}, pool["in_use"]))
+        out["trikon_rembg_waiting"].append(({"model": model}, pool["waiting"]))
+        out["trikon_rembg_wait_seconds_max"].append(({"model": model}, round(pool["max_wait_s"], 6)))
+
+    for name, executor in get_offload_stats().items():
+        out["trikon_executor_workers"].append(({"executor": name}, executor["workers"]))
+        out["trikon_executor_in_flight"].append(({"executor": name}, executor["in_flight"]))
+        out["trikon_executor_calls_total"].append(({"executor": name}, executor["calls"]))
+        out["trikon_executor_wait_seconds_avg"].append(({"executor": name}, executor["avg_wait_s"]))
+
+    jobs = get_job_queue().stats()
+    out["trikon_job_workers"].append(({}, jobs["workers"]))
+    for status, count in jobs["jobs"].items():
+        out["trikon_jobs"].append(({"status": status}, count))
+
+    lag = LOOP_LAG.stats()
+    out["trikon_event_loop_lag_seconds"].append(({}, lag["last_ms"] / 1000))
+    out["trikon_event_loop_lag_max_seconds"].append(({}, lag["max_ms"] / 1000))
+    out["trikon_event_loop_slow_samples_total"].append(({}, lag["slow_samples"]))
+    return out
+
+
+def _block(name, kind, documentation, samples):
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    lines += [f"{sample}{_format_labels(labels)} {_format_value(value)}" for sample, labels, value in samples]
+    return lines
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in list(_REGISTRY):
+        samples = metric.samples()
+        if samples:
+            lines += _block(metric.name, metric.kind, metric.documentation, samples)
+    try:
+        runtime = _runtime_samples()
+    except Exception as e:
+        print(f"Metrics collection failed: {e}")
+        runtime = {}
+    for name, samples in runtime.items():
+        if samples:
+            kind, documentation = _RUNTIME[name]
+            lines += _block(name, kind, documentation, [(name, labels, value) for labels, value in samples])
+    return "\n".join(lines) + "\n"
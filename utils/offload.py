@@ -0,0 +1,162 @@
+import os
+import time
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.settings_manager import get_setting
+
+# Blocking work never runs on the event loop. It goes to one of three bounded
+# executors so a burst of one kind can't starve the others:
+#   render - PyMuPDF composition, rasterization and encoding
+#   ml     - decode, face detection and rembg matting (sized like the rembg pool)
+#   io     - uploads, asset listing, settings and other disk access
+
+
+def _workers(env_name, key, default):
+    value = os.environ.get(env_name) or get_setting("performance", key)
+    return int(value or 0) or default
+
+
+class Offloader:
+    """
+    Bounded executor for one class of blocking work.
+    At most `max_pending` calls are queued or running; further callers wait
+    on the event loop (not in the executor queue), so memory stays bounded.
+    Queue wait and run time are recorded for stats().
+    """
+
+    def __init__(self, name, workers, max_pending=None):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.max_pending = max_pending or self.workers * 8
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{name}-")
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._calls = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    def _timed(self, fn, queued_at, args, kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            wait = started - queued_at
+            with self._lock:
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+                self._total_run += time.perf_counter() - started
+
+    async def run(self, fn, *args, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+        queued_at = time.perf_counter()
+        async with self._semaphore:
+            with self._lock:
+                self._in_flight += 1
+                self._calls += 1
+            try:
+                loop = asyncio.get_running_loop()
+                call = functools.partial(self._timed, fn, queued_at, args, kwargs)
+                return await loop.run_in_executor(self._executor, call)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            calls = self._calls
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "calls": calls,
+                "avg_wait_s": round(self._total_wait / calls, 4) if calls else 0.0,
+                "max_wait_s": round(self._max_wait, 4),
+                "avg_run_s": round(self._total_run / calls, 4) if calls else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _ml_workers():
+    from utils.image_processing import get_rembg_pool, resolve_matting_model
+    return get_rembg_pool(resolve_matting_model(quality="high")).size
+
+
+_cpus = os.cpu_count() or 1
+RENDER = Offloader("render", _workers("RENDER_WORKERS", "render_workers", max(1, min(4, _cpus))))
+ML = Offloader("ml", _workers("ML_WORKERS", "ml_workers", 0) or _ml_workers())
+IO = Offloader("io", _workers("IO_WORKERS", "io_workers", 4))
+
+
+async def run_render(fn, *args, **kwargs):
+    return await RENDER.run(fn, *args, **kwargs)
+
+
+async def run_ml(fn, *args, **kwargs):
+    return await ML.run(fn, *args, **kwargs)
+
+
+async def run_io(fn, *args, **kwargs):
+    return await IO.run(fn, *args, **kwargs)
+
+
+def get_offload_stats():
+    return {o.name: o.stats() for o in (RENDER, ML, IO)}
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: a task sleeps `interval` seconds and records how
+    late it wakes up. Anything blocking the loop shows up here directly.
+    """
+
+    def __init__(self, interval=0.1, slow_threshold=0.1):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self._task = None
+        self.samples = 0
+        self.last = 0.0
+        self.max = 0.0
+        self.total = 0.0
+        self.slow = 0 # Samples lagging more than slow_threshold
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples += 1
+            self.last = lag
+            self.max = max(self.max, lag)
+            self.total += lag
+            if lag > self.slow_threshold:
+                self.slow += 1
+                print(f"Event loop blocked for {lag * 1000:.0f}ms")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        return {
+            "last_ms": round(self.last * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "avg_ms": round(self.total / self.samples * 1000, 2) if self.samples else 0.0,
+            "slow_samples": self.slow,
+            "samples": self.samples,
+        }
+
+
+LOOP_LAG = LoopLagMonitor()
@@ -0,0 +1,83 @@
+import io
+import math
+import hashlib
+import fitz
+import numpy as np
+from PIL import Image, ImageDraw, ImageOps
+
+
+class Photo:
+    """
+    Decoded image passed between the crop, matte and PDF insertion stages so a
+    request decodes the upload once and only encodes the final output.
+    `key` identifies the pixels: the md5 of the uploaded bytes for a decoded
+    photo, or a digest of the parent key plus the stage that produced it.
+    """
+    __slots__ = ("image", "key", "source_format")
+
+    def __init__(self, image, key, source_format=None):
+        self.image = image
+        self.key = key
+        self.source_format = source_format
+
+    @classmethod
+    def from_bytes(cls, image_bytes, max_pixels=None):
+        """
+        Decodes upload bytes. With max_pixels, JPEGs are decoded at the smallest
+        DCT scale (1/2, 1/4, 1/8) that still has at least max_pixels, so a
+        48 MP photo is never materialized just to be downscaled.
+        """
+        img = Image.open(io.BytesIO(image_bytes))
+        source_format = img.format
+        width, height = img.size
+        if max_pixels and width * height > max_pixels:
+            ratio = math.sqrt(max_pixels / (width * height))
+            img.draft("RGB", (max(1, int(width * ratio)), max(1, int(height * ratio))))
+        img.load()
+        if img.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in img.getbands() or "transparency" in img.info
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        return cls(img, hashlib.md5(image_bytes).hexdigest(), source_format)
+
+    def derive(self, image, stage):
+        """Returns the output of a processing stage, keyed by parent key + stage."""
+        key = hashlib.md5(f"{self.key}:{stage}".encode()).hexdigest()
+        return Photo(image, key, self.source_format)
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def nbytes(self):
+        return self.image.width * self.image.height * len(self.image.getbands())
+
+    def gray(self):
+        """Grayscale NumPy view for OpenCV detection."""
+        return np.asarray(self.image.convert("L"))
+
+    def to_png(self):
+        buf = io.BytesIO()
+        self.image.save(buf, format="PNG")
+        return buf.getvalue()
+
+    def to_pixmap(self):
+        """
+        fitz.Pixmap built straight from the pixel buffer (no PNG round-trip).
+        MuPDF expects premultiplied alpha, so RGBA is converted to RGBa first;
+        straight alpha would turn soft matte edges into a light halo.
+        """
+        img = self.image
+        if img.mode == "RGBA":
+            return fitz.Pixmap(fitz.csRGB, img.width, img.height, img.convert("RGBa").tobytes(), True)
+        return fitz.Pixmap(fitz.csRGB, img.width, img.height, img.tobytes(), False)
+
+
+def make_rounded(image, width, height, radius):
+    image = ImageOps.fit(image, (int(width), int(height)), method=Image.Resampling.LANCZOS)
+    mask = Image.new('L', (int(width), int(height)), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.rounded_rectangle([(0, 0), (int(width), int(height))], radius=radius, fill=255)
+    rounded_img = Image.new('RGBA', (int(width), int(height)), (0, 0, 0, 0))
+    rounded_img.paste(image, (0, 0), mask)
+    return rounded_img
@@ -0,0 +1,90 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from utils.settings_manager import get_setting
+
+# Short-lived store of processed ID card photos so /api/generate-id-card can
+# reuse the crop and matte /api/preview-id-card already made instead of
+# starting over. Only the photos are kept; the PDF is composed on redeem.
+_TTL_SECONDS = 600
+
+_LOCK = threading.Lock()
+_RENDERS = OrderedDict() # Key: token, Value: RenderSession
+
+
+def _budget():
+    """Byte budget for the stored photos: RENDER_TOKEN_MB env var, else settings."""
+    mb = os.environ.get("RENDER_TOKEN_MB") or get_setting("performance", "render_token_mb") or 64
+    return int(float(mb) * 1024 * 1024)
+
+
+_MAX_BYTES = _budget()
+
+
+class RenderSession:
+    """
+    One preview's photo work: the upload's content key, the cropped photo and
+    the final (matted) photo with the model that produced it. `final` is the
+    matte with the final-quality model when the preview used a faster one:
+    a Future started in the background, so generate usually finds it done.
+    """
+    __slots__ = ("source_key", "use_auto_crop", "cropped", "model", "photo",
+                 "final_model", "final", "expires")
+
+    def __init__(self, source_key, use_auto_crop, cropped, model, photo):
+        self.source_key = source_key
+        self.use_auto_crop = use_auto_crop
+        self.cropped = cropped
+        self.model = model  # None when background removal was off
+        self.photo = photo
+        self.final_model = None
+        self.final = None
+        self.expires = time.monotonic() + _TTL_SECONDS
+
+    def final_photo(self):
+        """The background final-model matte, or None if it is pending, failed or cancelled."""
+        final = self.final
+        if final is None or not final.done() or final.cancelled() or final.exception() is not None:
+            return None
+        return final.result()
+
+    @property
+    def nbytes(self):
+        photos = {id(p): p for p in (self.cropped, self.photo, self.final_photo()) if p is not None}
+        return sum(p.nbytes for p in photos.values())
+
+
+def _drop(session):
+    if session.final is not None:
+        session.final.cancel()
+
+
+def _purge(now):
+    for token in [t for t, s in _RENDERS.items() if s.expires <= now]:
+        _drop(_RENDERS.pop(token))
+    # Oldest first until the photos fit the byte budget
+    total = sum(s.nbytes for s in _RENDERS.values())
+    while _RENDERS and total > _MAX_BYTES:
+        _, session = _RENDERS.popitem(last=False)
+        total -= session.nbytes
+        _drop(session)
+
+
+def store_render(session):
+    """Keeps a RenderSession for a while and returns its token."""
+    token = secrets.token_urlsafe(16)
+    with _LOCK:
+        _RENDERS[token] = session
+        _purge(time.monotonic())
+    return token
+
+
+def get_render(token):
+    """Returns the RenderSession for a token, or None if unknown or expired."""
+    if not token:
+        return None
+    with _LOCK:
+        _purge(time.monotonic())
+        return _RENDERS.get(token)
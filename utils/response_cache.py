@@ -0,0 +1,82 @@
+import os
+import json
+import hashlib
+import threading
+from utils.cache import LRUByteCache
+from utils.settings_manager import get_setting, settings_version
+from utils.template_cache import get_template
+from utils.fonts import fonts_version
+
+
+def _response_cache_budget():
+    """Byte budget for rendered responses: RESPONSE_CACHE_MB env var, else settings."""
+    mb = os.environ.get("RESPONSE_CACHE_MB") or get_setting("performance", "response_cache_mb")
+    return int(float(mb or 32) * 1024 * 1024)
+
+
+# Key: resp_<kind>_<sha256>, Value: (content, media_type, headers)
+_RESPONSES = LRUByteCache(_response_cache_budget(), sizeof=lambda v: len(v[0]))
+_LOCK = threading.Lock()
+_NOT_MODIFIED = {} # Key: kind, Value: 304s answered
+
+
+def render_key(kind, plan, fields, photo_hash=None):
+    """
+    Deterministic key for one render: settings version, template and font file
+    revisions, the form fields and the uploaded photo's hash. The same inputs
+    give the same key in every worker, so it doubles as a strong ETag.
+    """
+    parts = {
+        "settings": settings_version(),
+        "template": get_template(plan.template, fallback=plan.fallback).version,
+        "fonts": fonts_version({alias for aliases in plan.fonts.values() for alias in aliases}),
+        "fields": fields,
+        "photo": photo_hash,
+    }
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f"resp_{kind}_{digest}"
+
+
+def etag_for(key):
+    return '"' + key.rpartition("_")[2] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check (weak comparison, as RFC 9110 requires for it)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def get_response(key):
+    """Returns (content, media_type, headers) for a key, or None."""
+    return _RESPONSES.get(key)
+
+
+def store_response(key, content, media_type, headers=None):
+    _RESPONSES.put(key, (content, media_type, dict(headers or {})))
+
+
+def record_not_modified(key):
+    kind = key[len("resp_"):].rpartition("_")[0]
+    with _LOCK:
+        _NOT_MODIFIED[kind] = _NOT_MODIFIED.get(kind, 0) + 1
+
+
+def clear_responses():
+    _RESPONSES.clear()
+
+
+def get_response_cache_stats():
+    """Cache usage plus hit rate per endpoint and 304s answered."""
+    stats = _RESPONSES.stats()
+    for counters in stats["namespaces"].values():
+        total = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / total, 3) if total else 0.0
+    with _LOCK:
+        stats["not_modified"] = dict(_NOT_MODIFIED)
+    return stats
@@ -0,0 +1,99 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class SessionPool:
+    """
+    Bounded pool of inference sessions.
+    Sessions are created lazily up to `size`; once all are checked out,
+    callers block until one is returned. Wait times are recorded so queueing
+    shows up in stats instead of as unexplained latency.
+    """
+
+    def __init__(self, factory, size):
+        self._factory = factory
+        self.size = max(1, int(size))
+        self._idle = queue.LifoQueue()  # LIFO keeps the warmest session busy
+        self._lock = threading.Lock()
+        self._created = 0
+        self._waiting = 0
+        self._in_use = 0
+        self._acquisitions = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _acquire(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        # Raises queue.Empty on timeout
+        return self._idle.get(timeout=timeout)
+
+    @contextmanager
+    def session(self, timeout=None):
+        """Checks out a session for the duration of the with-block."""
+        start = time.perf_counter()
+        with self._lock:
+            self._waiting += 1
+        try:
+            sess = self._acquire(timeout)
+        finally:
+            wait = time.perf_counter() - start
+            with self._lock:
+                self._waiting -= 1
+        with self._lock:
+            self._in_use += 1
+            self._acquisitions += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        if wait > 0.5:
+            print(f"Waited {wait:.2f}s for a free inference session")
+        try:
+            yield sess
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(sess)
+
+    def warm(self, prime=None):
+        """
+        Creates every session up front (e.g. at startup).
+        `prime(session)` is called on each one, e.g. to run a dummy inference.
+        """
+        sessions = []
+        try:
+            for _ in range(self.size):
+                sessions.append(self._acquire(timeout=None))
+            if prime is not None:
+                for sess in sessions:
+                    prime(sess)
+        finally:
+            for sess in sessions:
+                self._idle.put(sess)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "acquisitions": self._acquisitions,
+                "avg_wait_s": self._total_wait / self._acquisitions if self._acquisitions else 0.0,
+                "max_wait_s": self._max_wait,
+            }
@@ -1,5 +1,9 @@
 import json
 import os
+import hashlib
+import tempfile
+import threading
+from types import MappingProxyType
 
 # Default settings matching the current hardcoded values
 DEFAULT_SETTINGS = {
@@ -41,32 +45,138 @@ DEFAULT_SETTINGS = {
             "top_headroom": 0.3,
             "bottom_extension": 0.3
         }
+    },
+    "background_removal": {
+        "preview_model": "u2netp",
+        "final_model": "u2net"
+    },
+    "performance": {
+        "image_cache_mb": 256,
+        "preview_cache_mb": 64,
+        "response_cache_mb": 32,
+        "render_token_mb": 64,
+        "disk_cache_dir": "",
+        "disk_cache_mb": 1024,
+        "rembg_batch_size": 8,
+        "bulk_workers": 0,
+        "job_workers": 1,
+        "job_timeout_seconds": 120,
+        "job_prewarm": False,
+        "render_workers": 0,
+        "ml_workers": 0,
+        "io_workers": 0,
+        "max_upload_mb": 25,
+        "max_bulk_upload_mb": 512,
+        "max_image_megapixels": 120,
+        "rembg_pool_size": 0,
+        "rembg_intra_op_threads": 0,
+        "rembg_inter_op_threads": 0
     }
 }
 
 SETTINGS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "settings.json")
 
-def load_settings():
-    """Loads settings from JSON, fallback to defaults if not exists."""
-    if not os.path.exists(SETTINGS_FILE):
-        return DEFAULT_SETTINGS
-    
+# Parsed, defaults-merged settings; re-read only when the file's mtime/size change
+_CACHE_LOCK = threading.Lock()
+_CACHE = {"stamp": None, "snapshot": None, "version": None}
+
+def _freeze(value):
+    """Read-only deep copy: dicts become mappingproxies, lists become tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def settings_to_dict(value):
+    """Mutable (JSON-serialisable) copy of a settings snapshot."""
+    if isinstance(value, MappingProxyType):
+        return {k: settings_to_dict(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [settings_to_dict(v) for v in value]
+    return value
+
+def _merge(defaults, overrides):
+    merged = dict(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def _file_stamp():
     try:
-        with open(SETTINGS_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading settings: {e}")
-        return DEFAULT_SETTINGS
+        st = os.stat(SETTINGS_FILE)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def load_settings_versioned():
+    """
+    Returns (snapshot, version): an immutable snapshot of the settings
+    (settings.json merged over the defaults) and its content hash, read
+    together under the cache lock. The file is only parsed again when its
+    mtime or size change.
+    """
+    stamp = _file_stamp()
+    with _CACHE_LOCK:
+        if _CACHE["snapshot"] is not None and _CACHE["stamp"] == stamp:
+            return _CACHE["snapshot"], _CACHE["version"]
+
+        data = {}
+        if stamp is not None:
+            try:
+                with open(SETTINGS_FILE, 'r') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Error loading settings: {e}")
+                # Keep serving the last good snapshot rather than the defaults
+                if _CACHE["snapshot"] is not None:
+                    _CACHE["stamp"] = stamp
+                    return _CACHE["snapshot"], _CACHE["version"]
+
+        merged = _merge(DEFAULT_SETTINGS, data)
+        _CACHE["stamp"] = stamp
+        _CACHE["snapshot"] = _freeze(merged)
+        _CACHE["version"] = hashlib.md5(json.dumps(merged, sort_keys=True).encode()).hexdigest()
+        return _CACHE["snapshot"], _CACHE["version"]
+
+def load_settings():
+    """Returns an immutable snapshot of the settings."""
+    return load_settings_versioned()[0]
+
+def settings_version():
+    """Content hash of the current settings, identical across worker processes."""
+    return load_settings_versioned()[1]
+
+def _invalidate_settings():
+    with _CACHE_LOCK:
+        _CACHE["stamp"] = _CACHE["snapshot"] = _CACHE["version"] = None
 
 def save_settings(settings):
-    """Saves settings to JSON."""
+    """Saves settings to JSON atomically (temp file + rename)."""
+    directory = os.path.dirname(SETTINGS_FILE)
     try:
-        with open(SETTINGS_FILE, 'w') as f:
-            json.dump(settings, f, indent=4)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".settings-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(settings_to_dict(settings), f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, SETTINGS_FILE)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
         return True
     except Exception as e:
         print(f"Error saving settings: {e}")
         return False
+    finally:
+        _invalidate_settings()
 
 def get_setting(category, key=None):
     """Utility to get a specific setting."""
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+import fitz
+from utils.settings_manager import resolve_asset_path
+
+# Re-check a cached template's mtime at most this often, so a file replaced
+# outside /api/admin/upload-asset is still picked up without a stat per request.
+_REVALIDATE_SECONDS = 5.0
+
+_LOCK = threading.Lock()
+_RESOLVED = {} # Key: (name, category), Value: resolved absolute path
+_TEMPLATES = {} # Key: resolved path, Value: TemplateEntry
+
+
+class TemplateEntry:
+    """Raw bytes of a template file plus the mtime/size they were read at."""
+    __slots__ = ("path", "mtime", "size", "data", "checked_at")
+
+    def __init__(self, path, mtime, size, data):
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.data = data
+        self.checked_at = time.monotonic()
+
+    @property
+    def version(self):
+        """Identifies this revision of the file (for render/HTTP cache keys)."""
+        return f"{self.path}:{self.mtime}:{self.size}"
+
+
+def _resolve(name, category, fallback):
+    key = (name, category)
+    path = _RESOLVED.get(key)
+    if path is None:
+        path = resolve_asset_path(name, category=category) or fallback
+        if not path or not os.path.exists(path):
+            raise FileNotFoundError(f"Template not found: {name}")
+        _RESOLVED[key] = path
+    return path
+
+
+def _read(path):
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    return TemplateEntry(path, st.st_mtime, st.st_size, data)
+
+
+def get_template(name, category="template", fallback=None):
+    """
+    Returns the cached TemplateEntry for a template name, reading the file
+    only on first use, after invalidation or when its mtime/size changed.
+    """
+    with _LOCK:
+        path = _resolve(name, category, fallback)
+        entry = _TEMPLATES.get(path)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked_at < _REVALIDATE_SECONDS:
+            return entry
+        try:
+            st = os.stat(path)
+        except OSError:
+            # Moved or deleted: forget it and resolve again
+            _RESOLVED.pop((name, category), None)
+            _TEMPLATES.pop(path, None)
+            path = _resolve(name, category, fallback)
+            st = os.stat(path)
+        if entry is None or entry.mtime != st.st_mtime or entry.size != st.st_size:
+            entry = _read(path)
+            _TEMPLATES[path] = entry
+        entry.checked_at = now
+        return entry
+
+
+def open_template(name, category="template", fallback=None):
+    """Opens a fresh fitz.Document from the cached template bytes."""
+    entry = get_template(name, category, fallback)
+    filetype = os.path.splitext(entry.path)[1].lstrip(".").lower() or "pdf"
+    return fitz.open(stream=entry.data, filetype=filetype)
+
+
+def invalidate_templates():
+    """Drops all cached templates, e.g. after an admin uploads a replacement."""
+    with _LOCK:
+        _RESOLVED.clear()
+        _TEMPLATES.clear()
@@ -0,0 +1,101 @@
+import os
+from fastapi import HTTPException
+from PIL import Image
+from utils.settings_manager import get_setting
+from utils.offload import run_io
+
+# Bulk jobs and asset uploads carry ZIPs/PDFs, so they get the larger body cap
+_LARGE_UPLOAD_PATHS = ("/api/bulk/", "/api/admin/upload-asset")
+
+
+class UploadRejected(HTTPException):
+    """Raised for oversized or unreadable uploads; FastAPI answers it like any HTTPException."""
+
+
+def _limit(env_name, key, default):
+    return float(os.environ.get(env_name) or get_setting("performance", key) or default)
+
+
+def body_limit(path):
+    """Byte cap for a request body: MAX_UPLOAD_MB / MAX_BULK_UPLOAD_MB or settings."""
+    if path.startswith(_LARGE_UPLOAD_PATHS):
+        return int(_limit("MAX_BULK_UPLOAD_MB", "max_bulk_upload_mb", 512) * 1024 * 1024)
+    return int(_limit("MAX_UPLOAD_MB", "max_upload_mb", 25) * 1024 * 1024)
+
+
+def _too_large(limit):
+    return UploadRejected(413, f"Upload exceeds the {limit // (1024 * 1024)} MB limit")
+
+
+class UploadLimitMiddleware:
+    """
+    Caps request bodies while they stream in. A declared Content-Length over
+    the cap is refused before reading anything; otherwise the byte count is
+    checked on every chunk the app receives, so a chunked or lying client is
+    cut off at the cap instead of being spooled in full.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = body_limit(scope["path"])
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            return await self._reject(send, limit)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing as-is
+                    raise _too_large(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def _reject(send, limit):
+        body = f'{{"detail": "{_too_large(limit).detail}"}}'.encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def sniff_image(fileobj):
+    """
+    Reads only the image header (PIL opens lazily) and returns (format, size).
+    Rejects files Pillow can't identify and images over the pixel cap, before
+    anything is decoded or read into memory.
+    """
+    max_pixels = int(_limit("MAX_IMAGE_MEGAPIXELS", "max_image_megapixels", 120) * 1_000_000)
+    fileobj.seek(0)
+    try:
+        with Image.open(fileobj) as img:
+            image_format, size = img.format, img.size
+    except Image.DecompressionBombError:
+        raise UploadRejected(413, f"Image exceeds the {max_pixels // 1_000_000} megapixel limit")
+    except Exception:
+        raise UploadRejected(415, "Unsupported image format")
+    finally:
+        fileobj.seek(0)
+    if size[0] * size[1] > max_pixels:
+        raise UploadRejected(413, f"Image exceeds the {max_pixels // 1_000_000} megapixel limit")
+    return image_format, size
+
+
+def _read_image(fileobj):
+    sniff_image(fileobj)
+    return fileobj.read()
+
+
+async def read_image_upload(upload):
+    """Validates an UploadFile's header, then reads it. Replaces `await file.read()` for photos."""
+    return await run_io(_read_image, upload.file)